@@ -0,0 +1,139 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import AnswerBinary, AnswerDecimal, AnswerInteger, AnswerType, Question
+
+# Model that stores the answers to each type of question
+ANSWER_MODELS = {
+    AnswerType.BINARY.value: AnswerBinary,
+    AnswerType.SCALE_INT.value: AnswerInteger,
+    AnswerType.SCALE_DECIMAL.value: AnswerDecimal,
+}
+
+INGEST_FORMATS = ['csv', 'ndjson']
+INGEST_CHUNK_SIZE = 1000
+# Invalid rows are skipped and counted; only the first ones are reported in full
+MAX_REPORTED_ERRORS = 100
+
+
+def question_id_batches(batch_size):
+    # Yields every question id in ascending batches of batch_size, each read with an indexed range query
+    last_id = 0
+    while question_ids := list(
+        Question.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    ):
+        yield question_ids
+        last_id = question_ids[-1]
+
+
+def read_csv_answers(lines):
+    # Yields a dict per row of CSV text with a user,question,answer header
+    yield from csv.DictReader(lines)
+
+
+def read_ndjson_answers(lines):
+    # Yields the object on each non-blank line; lines that are not valid JSON are passed through as text
+    # so that ingest_answers() reports them as invalid rows
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+ANSWER_READERS = {
+    'csv': read_csv_answers,
+    'ndjson': read_ndjson_answers,
+}
+
+
+def parse_id(value):
+    # Ids are integers or, from CSV, strings of digits; int() alone would truncate an NDJSON 12.7 to 12
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError(f'{value!r} is not an integer id')
+    return int(value)
+
+
+def clean_answer_row(row, answer_types, user_ids):
+    # Returns an unsaved answer of the model matching the question's answer_type, or raises ValidationError
+    if not isinstance(row, dict):
+        raise ValidationError('Row is not an object with user, question and answer fields.')
+    try:
+        user_id = parse_id(row['user'])
+        question_id = parse_id(row['question'])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError('Row needs integer user and question ids.')
+    if question_id not in answer_types:
+        raise ValidationError(f'Question {question_id} does not exist.')
+    if user_id not in user_ids:
+        raise ValidationError(f'User {user_id} does not exist.')
+    model = ANSWER_MODELS.get(answer_types[question_id])
+    if model is None:
+        raise ValidationError(f'Question {question_id} does not accept {answer_types[question_id]} answers.')
+
+    value = row.get('answer')
+    answer = model._meta.get_field('answer').clean(None if value == '' else value, None)
+    return model(user_id=user_id, question_id=question_id, answer=answer)
+
+
+def write_answer_chunk(answers_by_model):
+    # Inserts a chunk of answers and adds them to the question results in the same transaction
+    with transaction.atomic():
+        for model, answers in answers_by_model.items():
+            model.objects.bulk_create(answers)
+            model.apply_answers(answers)
+
+
+def ingest_answers(rows, chunk_size=INGEST_CHUNK_SIZE):
+    # Validates and writes an iterable of answer rows chunk by chunk, so memory use is bounded by chunk_size
+    # whatever the size of the input. Returns a summary including the throughput in rows per second.
+    started = time.monotonic()
+    answer_types = {}
+    row_count = created = error_count = 0
+    errors = []
+    rows = iter(rows)
+
+    while chunk := list(islice(rows, chunk_size)):
+        question_ids, user_ids = set(), set()
+        for row in chunk:
+            if isinstance(row, dict):
+                question_ids.add(row.get('question'))
+                user_ids.add(row.get('user'))
+        question_ids = {int(pk) for pk in question_ids if str(pk).isdigit()} - answer_types.keys()
+        answer_types.update(Question.objects.filter(pk__in=question_ids).values_list('pk', 'answer_type'))
+        user_ids = set(User.objects.filter(pk__in=[int(pk) for pk in user_ids if str(pk).isdigit()])
+                       .values_list('pk', flat=True))
+
+        answers_by_model = defaultdict(list)
+        for row_number, row in enumerate(chunk, start=row_count + 1):
+            try:
+                answer = clean_answer_row(row, answer_types, user_ids)
+            except ValidationError as error:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': row_number, 'error': ' '.join(error.messages)})
+                continue
+            answers_by_model[type(answer)].append(answer)
+
+        write_answer_chunk(answers_by_model)
+        row_count += len(chunk)
+        created += sum(len(answers) for answers in answers_by_model.values())
+
+    elapsed = time.monotonic() - started
+    return {
+        'rows': row_count,
+        'created': created,
+        'invalid': error_count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(row_count / elapsed) if elapsed > 0 else row_count,
+    }
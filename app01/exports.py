@@ -0,0 +1,79 @@
+import csv
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import VOTABLE_MODELS, AnswerBinary, AnswerDecimal, AnswerInteger, Vote
+
+# Exportable tables: name -> (model, exported columns)
+EXPORT_TABLES = {
+    'votes': (Vote, ['id', 'user_id', 'votable_content_type_id', 'votable_object_id', 'vote', 'created_at']),
+    'binary_answers': (AnswerBinary, ['id', 'user_id', 'question_id', 'answer']),
+    'integer_answers': (AnswerInteger, ['id', 'user_id', 'question_id', 'answer']),
+    'decimal_answers': (AnswerDecimal, ['id', 'user_id', 'question_id', 'answer']),
+}
+
+EXPORT_FORMATS = ['csv', 'ndjson']
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    # File-like object whose write() returns the value, so csv.writer can produce lines for a generator
+
+    def write(self, value):
+        return value
+
+
+def votable_type_labels():
+    # {content type id: model name} for the votable models, read once per export instead of resolving
+    # each vote's GenericForeignKey
+    return {
+        content_type.pk: model.__name__
+        for model, content_type in ContentType.objects.get_for_models(*VOTABLE_MODELS).items()
+    }
+
+
+def export_rows(table, chunk_size=EXPORT_CHUNK_SIZE):
+    # Returns (header, rows) where rows lazily yields one tuple per record. values_list() skips model
+    # instances and iterator() streams from a server-side cursor where the backend has one, so memory stays
+    # bounded by chunk_size however many rows there are.
+    model, columns = EXPORT_TABLES[table]
+    rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    if model is not Vote:
+        return columns, rows
+
+    labels = votable_type_labels()
+    content_type_index = columns.index('votable_content_type_id')
+    header = columns[:content_type_index] + ['votable_type'] + columns[content_type_index + 1:]
+    return header, (
+        row[:content_type_index] + (labels.get(row[content_type_index]),) + row[content_type_index + 1:]
+        for row in rows
+    )
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_WRITERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
+
+
+def export_lines(table, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    # Lazily yields the export of table as lines of text in export_format
+    return EXPORT_WRITERS[export_format](*export_rows(table, chunk_size))
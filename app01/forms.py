@@ -1,6 +1,7 @@
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.models import User
-from .models import UserProfile, Vote, VoteType, KeyWord, KeyWordDefinition, Question, AnswerType, QuestionTag
+from .models import UserProfile, Vote, VoteType, KeyWord, KeyWordDefinition, Question, AnswerType, QuestionTag, Status, \
+    normalize_keyword
 from django_countries.fields import CountryField
 from django_countries.widgets import CountrySelectWidget
 from django import forms
@@ -22,13 +23,14 @@ class KeyWordForm(forms.ModelForm):
 
     def clean_word(self):
         word = self.cleaned_data.get('word')
-        if KeyWord.objects.filter(word__iexact=word).exists():
+        if KeyWord.objects.filter(word_key=normalize_keyword(word)).exists():
             raise forms.ValidationError('This keyword already exists.')
         return word
 
     def save(self, commit=True, creator=None, parent=None):  # Add a parent parameter
         word = self.cleaned_data.get('word')
-        keyword, created = KeyWord.objects.get_or_create(word=word, defaults={'creator': creator})
+        keyword, created = KeyWord.objects.get_or_create(word_key=normalize_keyword(word),
+                                                         defaults={'word': word, 'creator': creator})
         if not created and keyword.creator != creator:
             raise forms.ValidationError('This keyword already exists.')
         keyword_definition = super(KeyWordForm, self).save(commit=False)
@@ -38,7 +40,7 @@ class KeyWordForm(forms.ModelForm):
         if commit:
             keyword_definition.save()
             if parent:  # If a parent keyword is passed, add the new keyword as its child
-                parent.children.add(keyword)
+                parent.children.add(keyword, bulk=False)  # save() each child so its path is updated
 
         return keyword_definition
 
@@ -143,6 +145,22 @@ class ProposeQuestionForm(forms.ModelForm):
         return super().save(*args, **kwargs)
 
 
+class ChangeStatusForm(forms.Form):
+    # Statuses are stored by value ('Approved'), which the model field's (name, value) choices would reject
+    status = forms.ChoiceField(choices=[(status.value, status.value) for status in Status])
+
+    def __init__(self, *args, **kwargs):
+        self.instance = kwargs.pop('instance')
+        kwargs.setdefault('initial', {'status': self.instance.status})
+        kwargs.setdefault('prefix', f'question-{self.instance.pk}')
+        super().__init__(*args, **kwargs)
+
+    def save(self):
+        self.instance.status = self.cleaned_data['status']
+        self.instance.save(update_fields=['status'])
+        return self.instance
+
+
 class UserRegisterForm(UserCreationForm):
     email = forms.EmailField()
     address = forms.CharField()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from app01.voting import compact_vote_counter_shards
+
+
+class Command(BaseCommand):
+    help = 'Folds sharded vote counters back into the vote totals of each votable object'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of votable objects compacted per transaction')
+
+    def handle(self, *args, **options):
+        compacted = compact_vote_counter_shards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Compacted the vote counters of {compacted} votable objects'))
@@ -0,0 +1,38 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from app01.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORT_TABLES, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Streams votes or answers to a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORT_TABLES))
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', default='-', help='File to write, or - for standard output')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Number of rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        lines = export_lines(options['table'], options['format'], options['chunk_size'])
+        if options['output'] == '-':
+            rows = self.write_lines(lines, sys.stdout)
+        else:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                rows = self.write_lines(lines, output)
+
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed > 0 else rows
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {rows} lines from {options["table"]} in {elapsed:.2f}s ({rate:.0f} lines/s)'
+        ))
+
+    def write_lines(self, lines, output):
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from app01.voting import flush_vote_buffer
+
+
+class Command(BaseCommand):
+    help = 'Applies votes buffered in write-behind mode to the votes and vote totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of buffered votes applied per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, flushing every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            flushed = flush_vote_buffer(batch_size=options['batch_size'])
+            if flushed:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'Flushed {flushed} buffered votes in {elapsed:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Vote buffer flushed'))
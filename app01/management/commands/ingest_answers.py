@@ -0,0 +1,37 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from app01.answers import ANSWER_READERS, INGEST_CHUNK_SIZE, INGEST_FORMATS, ingest_answers
+
+
+class Command(BaseCommand):
+    help = 'Imports answers from a CSV (user,question,answer header) or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - to read standard input')
+        parser.add_argument('--format', choices=INGEST_FORMATS,
+                            help='Input format; by default taken from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE,
+                            help='Number of rows validated and written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in ANSWER_READERS:
+            raise CommandError(f'Cannot tell the format of {path}; pass --format {"|".join(INGEST_FORMATS)}')
+
+        if path == '-':
+            result = ingest_answers(ANSWER_READERS[input_format](sys.stdin), options['chunk_size'])
+        else:
+            with open(path, newline='', encoding='utf-8') as lines:
+                result = ingest_answers(ANSWER_READERS[input_format](lines), options['chunk_size'])
+
+        for error in result['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["error"]}')
+        if result['invalid'] > len(result['errors']):
+            self.stderr.write(f'... and {result["invalid"] - len(result["errors"])} more invalid rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["created"]} of {result["rows"]} rows ({result["invalid"]} invalid) '
+            f'in {result["seconds"]:.2f}s ({result["rows_per_second"]} rows/s)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from app01.models import process_reevaluation_queue
+
+
+class Command(BaseCommand):
+    help = 'Re-evaluates votable objects queued after a change in the live user count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of queued objects re-evaluated per transaction')
+
+    def handle(self, *args, **options):
+        processed = process_reevaluation_queue(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Re-evaluated {processed} votable objects'))
@@ -0,0 +1,84 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from app01.answers import question_id_batches
+from app01.models import AnswerDecimal, AnswerHistogramBucket, AnswerInteger
+
+SCALE_ANSWER_MODELS = [AnswerInteger, AnswerDecimal]
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the scale answer histograms for every question from the answer rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of questions rebuilt per transaction')
+        parser.add_argument('--numpy', action='store_true',
+                            help='Count values in NumPy instead of with a grouped query, for large backfills '
+                                 'where the database should only stream rows')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        count_values = self.count_values_numpy if options['numpy'] else self.count_values
+
+        for model in SCALE_ANSWER_MODELS:
+            started = time.monotonic()
+            buckets = questions = 0
+            for question_ids in question_id_batches(batch_size):
+                buckets += self.rebuild_batch(model, question_ids, count_values)
+                questions += len(question_ids)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: rebuilt {buckets} buckets for {questions} questions in {elapsed:.2f}s'
+            ))
+
+    def rebuild_batch(self, model, question_ids, count_values):
+        # Recounts the buckets of a batch of questions in one transaction and returns the number of non-empty
+        # buckets. The existing buckets are locked before the answers are counted, so an answer saved meanwhile
+        # adds its F() delta after the exact counts are written; they are set to zero rather than deleted, which
+        # would make that delta miss. Buckets with no row yet are created and added to by add_bucket_counts().
+        with transaction.atomic():
+            stored = list(AnswerHistogramBucket.objects.select_for_update().filter(
+                scale_type=model.scale_type, question_id__in=question_ids
+            ))
+            counts = {
+                (question_id, Decimal(value)): count
+                for question_id, value, count in count_values(
+                    model.objects.filter(question_id__in=question_ids, answer__isnull=False)
+                )
+            }
+            buckets = len(counts)
+
+            changed = []
+            for bucket in stored:
+                count = counts.pop((bucket.question_id, bucket.value), 0)
+                if bucket.count != count:
+                    bucket.count = count
+                    changed.append(bucket)
+            AnswerHistogramBucket.objects.bulk_update(changed, ['count'], batch_size=1000)
+            AnswerHistogramBucket.add_bucket_counts(model.scale_type, counts)
+        return buckets
+
+    def count_values(self, answers):
+        # [(question id, value, number of answers)] from one grouped query
+        return list(answers.values_list('question_id', 'answer').annotate(count=Count('id')).order_by())
+
+    def count_values_numpy(self, answers):
+        # Same result, with the database only streaming rows; values are counted as whole hundredths
+        try:
+            import numpy
+        except ImportError:
+            raise CommandError('--numpy requires NumPy to be installed')
+        rows = answers.values_list('question_id', 'answer').iterator(chunk_size=10000)
+        keys = numpy.array([(question_id, round(answer * 100)) for question_id, answer in rows], dtype=numpy.int64)
+        if not len(keys):
+            return []
+        keys, counts = numpy.unique(keys, axis=0, return_counts=True)
+        return [
+            (int(question_id), Decimal(int(hundredths)) / 100, int(count))
+            for (question_id, hundredths), count in zip(keys, counts)
+        ]
@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from app01.answers import question_id_batches
+from app01.models import AnswerBinary, AnswerBinaryData, AnswerDecimal, AnswerInteger
+
+NUMERIC_ANSWER_MODELS = [AnswerInteger, AnswerDecimal]
+DATA_FIELDS = ['count', 'total', 'total_squares']
+BINARY_DATA_FIELDS = ['total_positive', 'total_negative', 'positive_percentage', 'negative_percentage']
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the binary answer counters and running answer statistics for every question from the answer rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of questions recomputed per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.recompute_binary_data(batch_size)
+
+        for model in NUMERIC_ANSWER_MODELS:
+            started = time.monotonic()
+            corrected = sum(self.recompute_numeric_batch(model, question_ids)
+                            for question_ids in question_id_batches(batch_size))
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: corrected statistics for {corrected} questions in {elapsed:.2f}s'
+            ))
+
+    def recompute_numeric_batch(self, model, question_ids):
+        # Recounts the statistics of a batch of questions in one transaction and returns the number corrected.
+        # The data rows are created if missing and locked before the answers are aggregated, so an answer saved
+        # meanwhile adds its F() delta after the exact values are written instead of being overwritten by them.
+        data_model = model.data_model
+        answers = model.objects.filter(question_id__in=question_ids, answer__isnull=False)
+        with transaction.atomic():
+            data_model.objects.bulk_create([
+                data_model(question_id=question_id)
+                for question_id in answers.order_by().values_list('question_id', flat=True).distinct()
+            ], ignore_conflicts=True)
+            data_rows = list(data_model.objects.select_for_update().filter(question_id__in=question_ids))
+
+            # One grouped aggregate over the batch's answers: {question id: (count, total, total of squares)}
+            rows = answers.values('question_id').annotate(
+                answer_count=Count('answer'),
+                answer_total=Sum('answer'),
+                answer_total_squares=Sum(F('answer') * F('answer')),
+            )
+            stats = {
+                row['question_id']: (row['answer_count'], row['answer_total'], row['answer_total_squares'])
+                for row in rows
+            }
+
+            corrected = []
+            for data in data_rows:
+                values = stats.get(data.question_id, (0, 0, 0))
+                if (data.count, data.total, data.total_squares) != values:
+                    data.count, data.total, data.total_squares = values
+                    corrected.append(data)
+            data_model.objects.bulk_update(corrected, DATA_FIELDS)
+        return len(corrected)
+
+    def recompute_binary_data(self, batch_size):
+        started = time.monotonic()
+        corrected = sum(self.recompute_binary_batch(question_ids) for question_ids in question_id_batches(batch_size))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'AnswerBinary: corrected counters for {corrected} questions in {elapsed:.2f}s'
+        ))
+
+    def recompute_binary_batch(self, question_ids):
+        # Same as recompute_numeric_batch() for the Yes and No counters of binary questions
+        answers = AnswerBinary.objects.filter(question_id__in=question_ids)
+        with transaction.atomic():
+            AnswerBinaryData.objects.bulk_create([
+                AnswerBinaryData(question_id=question_id)
+                for question_id in answers.order_by().values_list('question_id', flat=True).distinct()
+            ], ignore_conflicts=True)
+            data_rows = list(AnswerBinaryData.objects.select_for_update().filter(question_id__in=question_ids))
+
+            # One grouped aggregate over the batch's answers: {question id: (Yes answers, No answers)}
+            rows = answers.values('question_id').annotate(
+                total_positive=Count('id', filter=Q(answer=1)),
+                total_negative=Count('id', filter=Q(answer=-1)),
+            )
+            totals = {row['question_id']: (row['total_positive'], row['total_negative']) for row in rows}
+
+            corrected = []
+            for data in data_rows:
+                values = totals.get(data.question_id, (0, 0))
+                if (data.total_positive, data.total_negative) != values:
+                    data.total_positive, data.total_negative = values
+                    data.update_percentages()
+                    corrected.append(data)
+            AnswerBinaryData.objects.bulk_update(corrected, BINARY_DATA_FIELDS)
+        return len(corrected)
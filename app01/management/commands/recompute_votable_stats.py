@@ -0,0 +1,90 @@
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Count
+from app01.models import VOTABLE_MODELS, VOTE_TALLY_FIELDS, KEYWORD_VOCABULARY_VERSION_COUNTER, KeyWord, Vote, \
+    VoteCounterShard, VoteType, bump_shared_version, get_live_user_count, invalidate_live_user_count
+
+STATS_FIELDS = VOTE_TALLY_FIELDS + ['participation_percentage', 'approval_percentage', 'status']
+
+
+class Command(BaseCommand):
+    help = 'Recomputes vote totals, percentages and status for every votable object'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of objects written per bulk update')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        invalidate_live_user_count()
+        total_users = get_live_user_count()
+
+        for model in VOTABLE_MODELS:
+            started = time.monotonic()
+            processed = 0
+            status_changes = 0
+            last_id = 0
+            while True:
+                batch, batch_status_changes = self.recompute_batch(model, last_id, batch_size, total_users)
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                processed += len(batch)
+                status_changes += batch_status_changes
+                self.stdout.write(f'{model.__name__}: {processed} updated')
+            if model is KeyWord and status_changes:
+                # bulk_update sends no signals, so invalidate highlighted definitions here
+                bump_shared_version(KEYWORD_VOCABULARY_VERSION_COUNTER)
+
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed > 0 else processed
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}: recomputed {processed} objects ({status_changes} status changes) '
+                f'in {elapsed:.2f}s ({rate:.0f} objects/s)'
+            ))
+
+    def recompute_batch(self, model, last_id, batch_size, total_users):
+        # Recounts the next batch_size objects after last_id in one transaction and returns
+        # (the updated objects, number of status changes). The recount already includes the votes held in counter
+        # shards, so the batch's shards are locked with the objects and deleted; compaction would otherwise
+        # add them a second time.
+        content_type = ContentType.objects.get_for_model(model)
+        with transaction.atomic():
+            batch = list(model.objects.select_for_update().only('id', *STATS_FIELDS)
+                         .filter(pk__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                return batch, 0
+            ids = [votable.id for votable in batch]
+            shard_ids = list(VoteCounterShard.objects.select_for_update().filter(
+                votable_content_type=content_type, votable_object_id__in=ids
+            ).values_list('pk', flat=True))
+            tallies = self.get_tallies(content_type, ids)
+
+            status_changes = 0
+            for votable in batch:
+                total_approve_votes, total_reject_votes = tallies.get(votable.id, (0, 0))
+                votable.total_approve_votes = total_approve_votes
+                votable.total_reject_votes = total_reject_votes
+                votable.total_votes = total_approve_votes + total_reject_votes
+                previous_status = votable.status
+                votable.update_percentages(total_users)
+                status_changes += votable.status != previous_status
+            model.objects.bulk_update(batch, STATS_FIELDS)
+            VoteCounterShard.objects.filter(pk__in=shard_ids).delete()
+        return batch, status_changes
+
+    def get_tallies(self, content_type, ids):
+        # One grouped aggregate over Vote for a batch of objects: {object id: (approve, reject)}
+        rows = Vote.objects.filter(votable_content_type=content_type, votable_object_id__in=ids).exclude(
+            vote=VoteType.NO_VOTE.value
+        ).values('votable_object_id').annotate(
+            total_approve_votes=Count('id', filter=models.Q(vote=VoteType.APPROVE.value)),
+            total_reject_votes=Count('id', filter=models.Q(vote=VoteType.REJECT.value)),
+        )
+        return {
+            row['votable_object_id']: (row['total_approve_votes'], row['total_reject_votes'])
+            for row in rows
+        }
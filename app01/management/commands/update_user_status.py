@@ -1,11 +1,40 @@
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
-from app01.models import UserProfile
+from django.db import transaction
+from django.utils import timezone
+from app01.models import USER_INACTIVE_PERIOD, UserProfile, get_live_user_count, invalidate_live_user_count, \
+    process_reevaluation_queue, queue_participation_reevaluation
 
 
 class Command(BaseCommand):
     help = 'Updates user status based on last visit'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many users would change status without updating them')
+
     def handle(self, *args, **options):
-        for profile in UserProfile.objects.all():
-            profile.check_user_status()
+        # Same rule as UserProfile.check_user_status(), applied with two set-based updates
+        cutoff = timezone.now() - timedelta(days=USER_INACTIVE_PERIOD)
+        expired = UserProfile.objects.filter(is_live=True, last_visited__lt=cutoff)
+        revived = UserProfile.objects.filter(is_live=False, last_visited__gte=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'Would mark {expired.count()} users inactive and {revived.count()} users live')
+            return
+
+        old_total_users = get_live_user_count()
+        with transaction.atomic():
+            expired_count = expired.update(is_live=False)
+            revived_count = revived.update(is_live=True)
+        invalidate_live_user_count()  # the updates above bypass the profile signals
+        self.stdout.write(f'Marked {expired_count} users inactive and {revived_count} users live')
+
+        if expired_count or revived_count:
+            queued = queue_participation_reevaluation(old_total_users, get_live_user_count())
+            reevaluated = process_reevaluation_queue()
+            self.stdout.write(f'Queued {queued} and re-evaluated {reevaluated} votable objects near the '
+                              f'participation threshold')
+
         self.stdout.write(self.style.SUCCESS('Successfully updated user statuses'))
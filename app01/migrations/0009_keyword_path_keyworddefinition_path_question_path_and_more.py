@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    # Walk each hierarchy from its roots so that every parent's path is known before its children's
+    for model_name in ['KeyWord', 'KeyWordDefinition', 'QuestionTag', 'Question']:
+        model = apps.get_model('app01', model_name)
+        parent_paths = {None: ''}
+        pending = list(model.objects.filter(parent__isnull=True).values_list('id', 'parent_id'))
+        while pending:
+            updated = []
+            for pk, parent_id in pending:
+                parent_paths[pk] = f'{parent_paths[parent_id]}{pk}/'
+                updated.append(model(pk=pk, path=parent_paths[pk]))
+            model.objects.bulk_update(updated, ['path'], batch_size=500)
+            pending = list(model.objects.filter(parent_id__in=[pk for pk, _ in pending]).values_list('id', 'parent_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0008_alter_keyword_approval_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyword',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='keyworddefinition',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='questiontag',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='status',
+            field=models.CharField(choices=[('PROPOSED', 'Proposed'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('ALTERNATIVE', 'Alternative')], default='Proposed', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='keyworddefinition',
+            name='status',
+            field=models.CharField(choices=[('PROPOSED', 'Proposed'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('ALTERNATIVE', 'Alternative')], default='Proposed', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='status',
+            field=models.CharField(choices=[('PROPOSED', 'Proposed'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('ALTERNATIVE', 'Alternative')], default='Proposed', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='questiontag',
+            name='status',
+            field=models.CharField(choices=[('PROPOSED', 'Proposed'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('ALTERNATIVE', 'Alternative')], default='Proposed', max_length=20),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('app01', '0009_keyword_path_keyworddefinition_path_question_path_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='keyword',
+            name='total_votes',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='keyworddefinition',
+            name='total_votes',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='total_votes',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='questiontag',
+            name='total_votes',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='PendingReevaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votable_object_id', models.PositiveIntegerField()),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+                ('votable_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'unique_together': {('votable_content_type', 'votable_object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0010_alter_keyword_total_votes_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='previous_vote',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('app01', '0011_vote_previous_vote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BufferedVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('votable_object_id', models.PositiveIntegerField()),
+                ('vote', models.IntegerField(choices=[(1, 'APPROVE'), (-1, 'REJECT'), (0, 'NO_VOTE')])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('votable_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['votable_content_type', 'votable_object_id'], name='app01_buffe_votable_893d07_idx')],
+            },
+        ),
+    ]
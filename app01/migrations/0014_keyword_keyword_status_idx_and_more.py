@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0013_votecountershard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='keyword',
+            index=models.Index(fields=['status', 'id'], name='keyword_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='keyworddefinition',
+            index=models.Index(fields=['status', 'id'], name='keyworddefinition_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', 'id'], name='question_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questiontag',
+            index=models.Index(fields=['status', 'id'], name='questiontag_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_live', True), ('is_verified', True)), fields=['id'], name='userprofile_electorate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_live', True)), fields=['last_visited'], name='userprofile_live_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_live', False)), fields=['last_visited'], name='userprofile_idle_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(condition=models.Q(('vote', 0), _negated=True), fields=['votable_content_type', 'votable_object_id', 'vote'], name='vote_votable_cast_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:10
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def populate_word_keys(apps, schema_editor):
+    # Same folding as app01.models.normalize_keyword
+    KeyWord = apps.get_model('app01', 'KeyWord')
+    keywords = list(KeyWord.objects.only('id', 'word').order_by('id'))
+    by_key = defaultdict(list)
+    for keyword in keywords:
+        keyword.word_key = keyword.word.casefold()
+        by_key[keyword.word_key].append(keyword)
+
+    # Keywords that only differ in case would fail the unique constraint below. Their votes, definitions and
+    # highlights can't be merged safely here, so stop and list them instead.
+    duplicates = [group for group in by_key.values() if len(group) > 1]
+    if duplicates:
+        listing = '\n'.join(
+            '  ' + ', '.join(f'{keyword.word!r} (id {keyword.id})' for keyword in group) for group in duplicates
+        )
+        raise RuntimeError(
+            'Keywords must be unique ignoring case, but these differ only in case:\n'
+            f'{listing}\n'
+            'Rename or merge them (e.g. in the admin), then run the migration again.'
+        )
+    KeyWord.objects.bulk_update(keywords, ['word_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0014_keyword_keyword_status_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyword',
+            name='word_key',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_word_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='keyword',
+            name='word_key',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='word',
+            field=models.CharField(max_length=255),
+        ),
+    ]
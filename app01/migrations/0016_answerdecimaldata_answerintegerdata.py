@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_answer_data(apps, schema_editor):
+    for answer_model, data_model in [('AnswerInteger', 'AnswerIntegerData'), ('AnswerDecimal', 'AnswerDecimalData')]:
+        answers = apps.get_model('app01', answer_model)
+        data = apps.get_model('app01', data_model)
+        rows = answers.objects.filter(answer__isnull=False).values('question_id').annotate(
+            answer_count=models.Count('answer'),
+            answer_total=models.Sum('answer'),
+            answer_total_squares=models.Sum(models.F('answer') * models.F('answer')),
+        )
+        data.objects.bulk_create([
+            data(question_id=row['question_id'], count=row['answer_count'], total=row['answer_total'],
+                 total_squares=row['answer_total_squares'])
+            for row in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0015_keyword_word_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerDecimalData',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='app01.question')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=4, default=0, max_digits=40)),
+                ('total_squares', models.DecimalField(decimal_places=4, default=0, max_digits=40)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AnswerIntegerData',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='app01.question')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=4, default=0, max_digits=40)),
+                ('total_squares', models.DecimalField(decimal_places=4, default=0, max_digits=40)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_answer_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+def populate_answer_binary_data(apps, schema_editor):
+    # Nothing maintained these rows before, so rebuild them all from the answers
+    AnswerBinary = apps.get_model('app01', 'AnswerBinary')
+    AnswerBinaryData = apps.get_model('app01', 'AnswerBinaryData')
+    rows = AnswerBinary.objects.values('question_id').annotate(
+        total_positive=models.Count('id', filter=models.Q(answer=1)),
+        total_negative=models.Count('id', filter=models.Q(answer=-1)),
+    )
+    AnswerBinaryData.objects.all().delete()
+    data = []
+    for row in rows:
+        answered = row['total_positive'] + row['total_negative']
+        data.append(AnswerBinaryData(
+            question_id=row['question_id'],
+            total_positive=row['total_positive'],
+            total_negative=row['total_negative'],
+            positive_percentage=row['total_positive'] * 100 / answered if answered else 0,
+            negative_percentage=row['total_negative'] * 100 / answered if answered else 0,
+        ))
+    AnswerBinaryData.objects.bulk_create(data, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0016_answerdecimaldata_answerintegerdata'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_answer_binary_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_histograms(apps, schema_editor):
+    AnswerHistogramBucket = apps.get_model('app01', 'AnswerHistogramBucket')
+    for answer_model, scale_type in [('AnswerInteger', 'SCALE_INT'), ('AnswerDecimal', 'SCALE_DECIMAL')]:
+        answers = apps.get_model('app01', answer_model)
+        rows = answers.objects.filter(answer__isnull=False).values_list('question_id', 'answer').annotate(
+            count=models.Count('id')
+        ).order_by()
+        AnswerHistogramBucket.objects.bulk_create([
+            AnswerHistogramBucket(question_id=question_id, scale_type=scale_type, value=value, count=count)
+            for question_id, value, count in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0017_populate_answerbinarydata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerHistogramBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scale_type', models.CharField(choices=[('SCALE_INT', 'SCALE_INT'), ('SCALE_DECIMAL', 'SCALE_DECIMAL')], max_length=30)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='histogram_buckets', to='app01.question')),
+            ],
+            options={
+                'unique_together': {('question', 'scale_type', 'value')},
+            },
+        ),
+        migrations.RunPython(populate_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0019_sharedcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='keyword',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='keyworddefinition',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='questiontag',
+            name='path',
+            field=models.TextField(blank=True, db_index=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0020_votable_path_text'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bufferedvote',
+            name='app01_buffe_votable_893d07_idx',
+        ),
+        migrations.AddField(
+            model_name='bufferedvote',
+            name='total_approve_votes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bufferedvote',
+            name='total_reject_votes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bufferedvote',
+            name='total_votes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='bufferedvote',
+            index=models.Index(fields=['votable_content_type', 'votable_object_id', 'user'], name='bufferedvote_votable_user_idx'),
+        ),
+    ]
@@ -1,18 +1,28 @@
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+import hashlib
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from functools import reduce
+from itertools import accumulate
+import operator
+import time
 from django.contrib.auth.signals import user_logged_in
 from enum import Enum
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django_countries.fields import CountryField
-from django.db.models import Avg, Count, StdDev
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Substr
 from django.contrib.contenttypes.models import ContentType
 
 
@@ -21,6 +31,9 @@ APPROVE_THRESHOLD = 50
 REJECT_THRESHOLD = 50
 
 
+VOTE_TALLY_FIELDS = ['total_votes', 'total_approve_votes', 'total_reject_votes']
+
+
 class VoteType(Enum):
     APPROVE = 1
     REJECT = -1
@@ -35,6 +48,27 @@ class VoteType(Enum):
         return cls.NO_VOTE.value
 
 
+def vote_deltas(old_vote, new_vote):
+    # Returns the (total, approve, reject) counter deltas for a vote changing from old_vote to new_vote.
+    def tally(vote):
+        vote = VoteType.NO_VOTE.value if vote is None else int(vote)
+        return (
+            int(vote != VoteType.NO_VOTE.value),
+            int(vote == VoteType.APPROVE.value),
+            int(vote == VoteType.REJECT.value),
+        )
+
+    return tuple(new - old for old, new in zip(tally(old_vote), tally(new_vote)))
+
+
+def vote_label(vote):
+    if vote is not None and int(vote) == VoteType.APPROVE.value:
+        return 'Approve'
+    elif vote is not None and int(vote) == VoteType.REJECT.value:
+        return 'Reject'
+    return 'No Vote'
+
+
 class Status(Enum):
     PROPOSED = 'Proposed'
     APPROVED = 'Approved'
@@ -49,6 +83,65 @@ class AnswerType(Enum):
     # Add other types as needed.
 
 
+class VotableQuerySet(models.QuerySet):
+    def with_user_vote(self, user):
+        # Annotates each object with user_vote, the user's vote value (None if they haven't voted), as a
+        # subquery of the same SELECT so list pages don't run a query per row.
+        content_type = ContentType.objects.get_for_model(self.model)
+        return self.annotate(user_vote=Subquery(
+            Vote.objects.filter(
+                user_id=user.pk,
+                votable_content_type=content_type,
+                votable_object_id=OuterRef('pk'),
+            ).values('vote')[:1]
+        ))
+
+    def with_pending_votes(self):
+        # Annotates each object with pending_<tally field>, the votes not yet in its stored counters: counter
+        # shard totals (settings.VOTE_COUNTER_SHARDS) and buffered vote deltas (settings.VOTE_WRITE_BEHIND),
+        # as subqueries of the same SELECT. app01.voting.merge_pending_tallies() adds them to the counters.
+        sources = []
+        if settings.VOTE_COUNTER_SHARDS:
+            sources.append(VoteCounterShard)
+        if settings.VOTE_WRITE_BEHIND:
+            sources.append(BufferedVote)
+        if not sources:
+            return self
+
+        content_type = ContentType.objects.get_for_model(self.model)
+
+        def pending_sum(source, field):
+            return Coalesce(Subquery(
+                source.objects.filter(votable_content_type=content_type, votable_object_id=OuterRef('pk'))
+                .order_by().values('votable_object_id').annotate(total=Sum(field)).values('total')
+            ), 0)
+
+        return self.annotate(**{
+            f'pending_{field}': reduce(operator.add, [pending_sum(source, field) for source in sources])
+            for field in VOTE_TALLY_FIELDS
+        })
+
+
+def get_user_votes(votables, user):
+    # Returns {votable: vote value} for the votables the user has voted on, using one query over Vote
+    # for any mix of votable models.
+    by_key = {(ContentType.objects.get_for_model(votable).id, votable.pk): votable for votable in votables}
+    if not by_key:
+        return {}
+
+    object_ids = defaultdict(list)
+    for content_type_id, object_id in by_key:
+        object_ids[content_type_id].append(object_id)
+    condition = models.Q()
+    for content_type_id, ids in object_ids.items():
+        condition |= models.Q(votable_content_type_id=content_type_id, votable_object_id__in=ids)
+
+    votes = Vote.objects.filter(condition, user_id=user.pk).values_list(
+        'votable_content_type_id', 'votable_object_id', 'vote'
+    )
+    return {by_key[(content_type_id, object_id)]: vote for content_type_id, object_id, vote in votes}
+
+
 class Votable(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
     status = models.CharField(
@@ -59,41 +152,95 @@ class Votable(models.Model):
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.CASCADE)
     participation_percentage = models.DecimalField(max_digits=3, decimal_places=0, default=0)
     approval_percentage = models.DecimalField(max_digits=3, decimal_places=0, default=0)
-    total_votes = models.PositiveIntegerField(default=0)
+    total_votes = models.PositiveIntegerField(default=0, db_index=True)
     total_approve_votes = models.PositiveIntegerField(default=0)
     total_reject_votes = models.PositiveIntegerField(default=0)
+    # Materialized path of ids from the root down to this object, e.g. '2/7/15/', maintained by save()
+    # so that ancestor and descendant lookups are a single indexed query at any depth.
+    path = models.TextField(blank=True, default='', db_index=True, editable=False)
+
+    objects = VotableQuerySet.as_manager()
 
     class Meta:
         abstract = True  # This makes Votable an abstract base class
+        # Listings filter on status and page on id (see keyset_paginate in views)
+        indexes = [models.Index(fields=['status', 'id'], name='%(class)s_status_idx')]
+
+    def save(self, *args, **kwargs):
+        # Only update_path() writes path. An instance loaded before one of its ancestors moved holds the old
+        # path, which a full save would otherwise write back over the rewritten one.
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'path'
+            ]
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'parent' in update_fields:
+            self.update_path()
+
+    def path_parent_id(self):
+        ids = self.path.split('/')[:-1]
+        return int(ids[-2]) if len(ids) > 1 else None
+
+    def update_path(self):
+        # Recompute the path after an insert or a change of parent, moving the whole subtree with it. The stored
+        # path is read first, as an ancestor may have moved since this instance was loaded.
+        model = self.__class__
+        self.path = model.objects.filter(pk=self.pk).values_list('path', flat=True).get()
+        if self.path and self.path_parent_id() == self.parent_id:
+            return
+
+        parent_path = ''
+        if self.parent_id is not None:
+            parent_path = model.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        old_path, new_path = self.path, f'{parent_path}{self.pk}/'
+
+        with transaction.atomic():
+            model.objects.filter(pk=self.pk).update(path=new_path)
+            if old_path:
+                model.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+                )
+        self.path = new_path
+
+    def get_ancestors(self, include_self=False):
+        # Ordered from the root down, as each ancestor's path is a prefix of the next one's
+        ids = [int(pk) for pk in self.path.split('/')[:-1]]
+        if not include_self:
+            ids = ids[:-1]
+        return self.__class__.objects.filter(pk__in=ids).order_by('path')
+
+    def get_descendants(self, include_self=False):
+        descendants = self.__class__.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def get_subtree_size(self):
+        return self.get_descendants(include_self=True).count()
 
     def calculate_status(self):
-        content_type = ContentType.objects.get_for_model(self.__class__)
-
-        total_votes = Vote.objects.filter(
-            votable_content_type=content_type,
-            votable_object_id=self.id
-        ).exclude(vote=VoteType.NO_VOTE.value).count()
-
-        vote_data = Vote.objects.filter(
-            votable_content_type=content_type,
-            votable_object_id=self.id
-        ).exclude(vote=VoteType.NO_VOTE.value).aggregate(
-            total_approve_votes=Count('id', filter=models.Q(vote=VoteType.APPROVE.value)),
-            total_reject_votes=Count('id', filter=models.Q(vote=VoteType.REJECT.value)),
-        )
+        previous_status = self.status
+        self.update_percentages(get_live_user_count())
+
+        update_fields = ['participation_percentage', 'approval_percentage']
+        if self.status != previous_status:
+            update_fields.append('status')  # lets post_save receivers tell a status change from a recount
+        self.save(update_fields=update_fields)
 
-        total_approve_votes = vote_data['total_approve_votes']
-        total_reject_votes = vote_data['total_reject_votes']
+        return self.status
+
+    def update_percentages(self, total_users):
+        # Percentages are derived from the stored vote counters, which are kept up to date by
+        # apply_vote_delta() whenever a Vote is created, changed or deleted. Nothing is saved here.
+        total_votes = self.total_votes
+        total_approve_votes = self.total_approve_votes
+        total_reject_votes = self.total_reject_votes
 
-        total_users = UserProfile.objects.filter(is_live=True).count()
         self.participation_percentage = (total_votes / total_users) * 100 if total_users > 0 else 0
         self.approval_percentage = (total_approve_votes / total_votes) * 100 if total_votes > 0 else 0
         rejection_percentage = (total_reject_votes / total_votes) * 100 if total_votes > 0 else 0
 
-        self.total_votes = total_votes
-        self.total_approve_votes = total_approve_votes
-        self.total_reject_votes = total_reject_votes
-
         # Change the status if the thresholds are met
         if self.participation_percentage >= 50:
             if self.approval_percentage > APPROVE_THRESHOLD:
@@ -101,9 +248,63 @@ class Votable(models.Model):
             elif rejection_percentage > REJECT_THRESHOLD:
                 self.status = Status.REJECTED.value
 
-        self.save()
-
-        return self.status
+    def apply_vote_delta(self, old_vote, new_vote, locked=False):
+        # Move one user's vote from old_vote to new_vote (None meaning no vote) by adjusting the
+        # stored counters in place, then recalculate the percentages and status from them.
+        return self.apply_tally_deltas(vote_deltas(old_vote, new_vote), locked=locked)
+
+    def apply_tally_deltas(self, tally_deltas, locked=False):
+        # Adds (total, approve, reject) deltas to the stored counters and recalculates the status.
+        # When the caller already holds this row's lock (select_for_update) the in-memory counters
+        # are current, so everything is written back with a single UPDATE.
+        deltas = {
+            field: delta
+            for field, delta in zip(VOTE_TALLY_FIELDS, tally_deltas)
+            if delta
+        }
+        if not deltas:
+            return self.status
+
+        if locked:
+            for field, delta in deltas.items():
+                setattr(self, field, getattr(self, field) + delta)
+            previous_status = self.status
+            self.update_percentages(get_live_user_count())
+            update_fields = VOTE_TALLY_FIELDS + ['participation_percentage', 'approval_percentage']
+            if self.status != previous_status:
+                update_fields.append('status')
+            self.save(update_fields=update_fields)
+            return self.status
+
+        with transaction.atomic():
+            self.__class__.objects.filter(pk=self.pk).update(
+                **{field: F(field) + delta for field, delta in deltas.items()}
+            )
+            self.refresh_from_db(fields=VOTE_TALLY_FIELDS)
+            return self.calculate_status()
+
+    def reconcile_votes(self):
+        # Full recount from the Vote table, used to repair any drift in the stored counters. The recount
+        # already includes the votes held in counter shards, so the object's shards are deleted in the same
+        # transaction; compaction would otherwise add them a second time. Locks are taken in the order
+        # compact_vote_counter_shards() uses: the votable, then its shards.
+        with transaction.atomic():
+            list(self.__class__.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
+            shard_ids = list(VoteCounterShard.objects.select_for_update().filter(
+                votable_content_type=ContentType.objects.get_for_model(self), votable_object_id=self.pk
+            ).values_list('pk', flat=True))
+            vote_data = self.get_votes().exclude(vote=VoteType.NO_VOTE.value).aggregate(
+                total_approve_votes=Count('id', filter=models.Q(vote=VoteType.APPROVE.value)),
+                total_reject_votes=Count('id', filter=models.Q(vote=VoteType.REJECT.value)),
+            )
+
+            self.total_approve_votes = vote_data['total_approve_votes']
+            self.total_reject_votes = vote_data['total_reject_votes']
+            self.total_votes = self.total_approve_votes + self.total_reject_votes
+            self.save(update_fields=VOTE_TALLY_FIELDS)
+            VoteCounterShard.objects.filter(pk__in=shard_ids).delete()
+
+        return self.calculate_status()
 
     def get_votes(self):
         content_type = ContentType.objects.get_for_model(self)
@@ -113,15 +314,9 @@ class Votable(models.Model):
         content_type = ContentType.objects.get_for_model(self)
         try:
             vote = Vote.objects.get(votable_content_type=content_type, votable_object_id=self.id, user=user)
-            if vote.vote == 1:
-                user_vote = 'Approve'
-            elif vote.vote == -1:
-                user_vote = 'Reject'
-            else:
-                user_vote = 'No Vote'
-            return user_vote
+            return vote_label(vote.vote)
         except Vote.DoesNotExist:
-            return 'No Vote'
+            return vote_label(None)
 
     def get_alternatives(self):
         return self.children.filter(status=Status.ALTERNATIVE.value)
@@ -133,24 +328,119 @@ class Vote(models.Model):
     votable_object_id = models.PositiveIntegerField()
     votable = GenericForeignKey('votable_content_type', 'votable_object_id')
     vote = models.IntegerField(choices=VoteType.choices(), default=VoteType.default())
+    # The vote this row held before its last change, written by the upsert in app01.voting so that the
+    # previous value comes back from the same statement.
+    previous_vote = models.IntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ['user', 'votable_content_type', 'votable_object_id']
+        # The unique index leads with user, so per-votable tallies need their own index. NO_VOTE rows never
+        # count towards a tally and are left out of it.
+        indexes = [
+            models.Index(
+                fields=['votable_content_type', 'votable_object_id', 'vote'],
+                name='vote_votable_cast_idx',
+                condition=~models.Q(vote=VoteType.NO_VOTE.value),
+            ),
+        ]
 
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new:
-            self.votable.calculate_status()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored vote so that save() and delete can apply the right tally delta.
+        instance._stored_vote = instance.__dict__.get('vote')
+        return instance
+
+    def get_stored_vote(self):
+        if self.pk is None:
+            return None
+        if getattr(self, '_stored_vote', None) is None:
+            self._stored_vote = Vote.objects.filter(pk=self.pk).values_list('vote', flat=True).first()
+        return self._stored_vote
+
+    def save(self, *args, update_tally=True, **kwargs):
+        # update_tally=False is for callers such as cast_vote() that update the votable themselves
+        if not update_tally:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                old_vote = self.get_stored_vote()
+                super().save(*args, **kwargs)
+                self.votable.apply_vote_delta(old_vote, self.vote)
+        self._stored_vote = self.vote
+
+    def delete(self, *args, update_tally=True, **kwargs):
+        self._update_tally = update_tally
+        return super().delete(*args, **kwargs)
+
+
+class BufferedVote(models.Model):
+    # Append-only buffer of submitted votes used in write-behind mode (settings.VOTE_WRITE_BEHIND).
+    # Rows are applied to Vote and the votable counters by app01.voting.flush_vote_buffer().
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    votable_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    votable_object_id = models.PositiveIntegerField()
+    vote = models.IntegerField(choices=VoteType.choices())
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Tally deltas from the user's previous vote (buffered or stored) to this one, set when the vote is
+    # buffered so that pending totals are a sum over the object's rows. Only used for display; flushing
+    # recomputes the deltas from the stored votes.
+    total_votes = models.IntegerField(default=0)
+    total_approve_votes = models.IntegerField(default=0)
+    total_reject_votes = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['votable_content_type', 'votable_object_id', 'user'],
+                                name='bufferedvote_votable_user_idx')]
+
+
+class VoteCounterShard(models.Model):
+    # One of settings.VOTE_COUNTER_SHARDS partial tallies for a votable object. Votes add their deltas
+    # to a random shard instead of the votable row, spreading writes on popular objects over several
+    # rows; app01.voting.compact_vote_counter_shards() folds the shards back into the votable fields.
+    votable_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    votable_object_id = models.PositiveIntegerField()
+    shard = models.PositiveSmallIntegerField()
+    total_votes = models.IntegerField(default=0)
+    total_approve_votes = models.IntegerField(default=0)
+    total_reject_votes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['votable_content_type', 'votable_object_id', 'shard']
+
+
+@receiver(post_delete, sender=Vote)
+def remove_vote_from_tally(sender, instance, **kwargs):
+    if not getattr(instance, '_update_tally', True):
+        return
+    votable = instance.votable
+    if votable is not None:
+        stored_vote = getattr(instance, '_stored_vote', None)
+        votable.apply_vote_delta(instance.vote if stored_vote is None else stored_vote, None)
+
+
+def normalize_keyword(word):
+    # Lookup key for case-insensitive keyword matching; the same folding is used by the keyword highlighter.
+    return word.casefold()
 
 
 class KeyWord(Votable):
-    word = models.CharField(max_length=255, unique=True)
+    word = models.CharField(max_length=255)
+    # Case-folded copy of word, maintained by save(). Uniqueness and every case-insensitive lookup go through
+    # this column so they can use its index instead of scanning with iexact.
+    word_key = models.CharField(max_length=255, unique=True, editable=False)
 
     def __str__(self):
         return self.word
 
+    def save(self, *args, **kwargs):
+        self.word_key = normalize_keyword(self.word)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'word' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'word_key'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('app01:keyword_detail', args=[str(self.word)])
 
@@ -164,6 +454,64 @@ class KeyWordDefinition(Votable):
         return self.definition
 
 
+KEYWORD_VOCABULARY_VERSION_COUNTER = 'keyword_vocabulary_version'
+KEYWORD_TREE_VERSION_COUNTER = 'keyword_tree_version'
+
+
+def get_shared_version(name):
+    # Version numbers kept in a SharedCounter, so a bump in one worker is seen by all of them. They also
+    # start from the current time, so a recreated counter never repeats a version cached content used.
+    return SharedCounter.get_value(name, time.time_ns)
+
+
+def bump_shared_version(name):
+    if not SharedCounter.add(name, 1):
+        get_shared_version(name)
+
+
+def get_keyword_vocabulary_version():
+    return get_shared_version(KEYWORD_VOCABULARY_VERSION_COUNTER)
+
+
+def get_keyword_tree_version():
+    return get_shared_version(KEYWORD_TREE_VERSION_COUNTER)
+
+
+def highlighted_definition_cache_key(keyword_definition, version=None):
+    # Keyed by the definition text as well, so an edited definition is rendered again in every worker
+    if version is None:
+        version = get_keyword_vocabulary_version()
+    digest = hashlib.md5(keyword_definition.definition.encode()).hexdigest()
+    return f'app01:highlighted_definition:{keyword_definition.pk}:{digest}:{version}'
+
+
+@receiver(post_save, sender=KeyWord)
+def keyword_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Highlighted text only depends on each keyword's word and status, the tree on its word and parent
+    changed = None if created or update_fields is None else set(update_fields)
+    if changed is None or {'word', 'status'} & changed:
+        bump_shared_version(KEYWORD_VOCABULARY_VERSION_COUNTER)
+    if changed is None or {'word', 'parent'} & changed:
+        bump_shared_version(KEYWORD_TREE_VERSION_COUNTER)
+
+
+@receiver(post_delete, sender=KeyWord)
+def keyword_deleted(sender, instance, **kwargs):
+    bump_shared_version(KEYWORD_VOCABULARY_VERSION_COUNTER)
+    bump_shared_version(KEYWORD_TREE_VERSION_COUNTER)
+
+
+@receiver(post_save, sender=KeyWordDefinition)
+def keyword_definition_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'definition', 'keyword'} & set(update_fields):
+        bump_shared_version(KEYWORD_TREE_VERSION_COUNTER)
+
+
+@receiver(post_delete, sender=KeyWordDefinition)
+def keyword_definition_deleted(sender, instance, **kwargs):
+    bump_shared_version(KEYWORD_TREE_VERSION_COUNTER)
+
+
 class QuestionTag(Votable):
     parent_tag = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='child_tags')
     question = models.ForeignKey('Question', on_delete=models.CASCADE)
@@ -186,15 +534,178 @@ class Question(Votable):
         return self.question_text
 
     def question_path(self):
-        path = []
-        question = self
-        while question is not None:
-            path.append(question.question_tag)
-            question = question.parent
-        return path[::-1]  # reversed so that it starts from root
+        if hasattr(self, '_question_path'):
+            return self._question_path  # filled in by prefetch_question_paths()
+        ancestors = self.get_ancestors(include_self=True).select_related('question_tag')
+        return [question.question_tag for question in ancestors]  # starts from root
+
+    @classmethod
+    def prefetch_question_paths(cls, questions):
+        # Fills in question_path() for a page of questions with one query for all of their ancestors
+        paths = {question: [int(pk) for pk in question.path.split('/')[:-1]] for question in questions}
+        ancestor_ids = {pk for ids in paths.values() for pk in ids}
+        tags = {
+            ancestor.pk: ancestor.question_tag
+            for ancestor in cls.objects.filter(pk__in=ancestor_ids).select_related('question_tag')
+        }
+        for question, ids in paths.items():
+            question._question_path = [tags[pk] for pk in ids if pk in tags]
+
+
+VOTABLE_MODELS = [KeyWord, KeyWordDefinition, QuestionTag, Question]
+
+
+class PendingReevaluation(models.Model):
+    # Votable objects whose participation may have crossed the 50% threshold after the live user
+    # count changed, waiting for process_reevaluation_queue().
+    votable_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    votable_object_id = models.PositiveIntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['votable_content_type', 'votable_object_id']
+
+
+def queue_participation_reevaluation(old_total_users, new_total_users):
+    # Participation reaches 50% when 2 * total_votes >= total_users, so after the electorate changes
+    # only objects with total_votes between half the old and half the new size can have crossed it.
+    # total_votes is indexed, so this never scans the votable tables.
+    low, high = sorted([old_total_users, new_total_users])
+    queued = 0
+    for model in VOTABLE_MODELS:
+        content_type = ContentType.objects.get_for_model(model)
+        candidate_ids = model.objects.filter(
+            total_votes__gte=math.ceil(low / 2),
+            total_votes__lt=math.ceil(high / 2),
+        ).values_list('id', flat=True)
+        pending = [
+            PendingReevaluation(votable_content_type=content_type, votable_object_id=votable_id)
+            for votable_id in candidate_ids.iterator()
+        ]
+        PendingReevaluation.objects.bulk_create(pending, batch_size=1000, ignore_conflicts=True)
+        queued += len(pending)
+    return queued
+
+
+def process_reevaluation_queue(batch_size=500):
+    # Recalculates queued objects against the current live user count, one batch at a time
+    total_users = get_live_user_count()
+    models_by_content_type = {ContentType.objects.get_for_model(model).id: model for model in VOTABLE_MODELS}
+    processed = 0
+    while True:
+        batch = list(PendingReevaluation.objects.order_by('id')[:batch_size])
+        if not batch:
+            return processed
+
+        object_ids = defaultdict(list)
+        for pending in batch:
+            object_ids[pending.votable_content_type_id].append(pending.votable_object_id)
+
+        with transaction.atomic():
+            for content_type_id, ids in object_ids.items():
+                model = models_by_content_type[content_type_id]
+                votables = list(model.objects.select_for_update().filter(pk__in=ids))
+                status_changed = False
+                for votable in votables:
+                    previous_status = votable.status
+                    votable.update_percentages(total_users)
+                    status_changed |= votable.status != previous_status
+                model.objects.bulk_update(votables, ['participation_percentage', 'approval_percentage', 'status'])
+                if model is KeyWord and status_changed:
+                    bump_shared_version(KEYWORD_VOCABULARY_VERSION_COUNTER)  # bulk_update sends no signals
+            PendingReevaluation.objects.filter(pk__in=[pending.pk for pending in batch]).delete()
+        processed += len(batch)
+
+
+class SummarizedAnswer(models.Model):
+    # Base for answer models whose per-question results are kept in a data_model row. save() and the
+    # post_delete receiver pass each change to apply_answer() so that results never need a scan of the answers.
+    data_model = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored question and answer so that save() and delete can undo them in the results.
+        if 'question_id' in instance.__dict__ and 'answer' in instance.__dict__:
+            instance._stored_answer = (instance.question_id, instance.answer)
+        return instance
+
+    @classmethod
+    def get_data(cls, question):
+        data = cls.data_model.objects.filter(question=question).first() or cls.data_model()
+        return data.get_data()
+
+    @classmethod
+    def apply_answer(cls, question_id, answer, sign=1):
+        raise NotImplementedError
+
+    @classmethod
+    def apply_answers(cls, answers):
+        # Adds answers written without save(), e.g. by bulk_create; subclasses batch the updates
+        for answer in answers:
+            cls.apply_answer(answer.question_id, answer.answer)
+
+    def get_stored_answer(self):
+        if self.pk is None:
+            return None
+        if getattr(self, '_stored_answer', None) is None:
+            self._stored_answer = type(self).objects.filter(pk=self.pk).values_list('question_id', 'answer').first()
+        return self._stored_answer
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            stored_answer = self.get_stored_answer()
+            super().save(*args, **kwargs)
+            if stored_answer != (self.question_id, self.answer):
+                if stored_answer is not None:
+                    self.apply_answer(*stored_answer, sign=-1)
+                self.apply_answer(self.question_id, self.answer)
+        self._stored_answer = (self.question_id, self.answer)
 
 
-class AnswerBinary(models.Model):
+class AnswerBinaryData(models.Model):
+    # Maintained by AnswerBinary.apply_answer(); percentages are of the Yes and No answers only
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True)
+    total_positive = models.IntegerField(default=0)
+    total_negative = models.IntegerField(default=0)
+    positive_percentage = models.FloatField(default=0)
+    negative_percentage = models.FloatField(default=0)
+
+    @classmethod
+    def add_answers(cls, question_id, positive, negative):
+        # Applies the given deltas (negative to remove answers) and the matching percentages in one UPDATE
+        if not positive and not negative:
+            return
+        if positive > 0 or negative > 0:
+            cls.objects.get_or_create(question_id=question_id)
+        total_positive = F('total_positive') + positive
+        total_negative = F('total_negative') + negative
+        answered = NullIf(total_positive + total_negative, 0)
+        cls.objects.filter(question_id=question_id).update(
+            total_positive=total_positive,
+            total_negative=total_negative,
+            positive_percentage=Coalesce(Cast(total_positive, models.FloatField()) * 100 / answered, 0.0),
+            negative_percentage=Coalesce(Cast(total_negative, models.FloatField()) * 100 / answered, 0.0),
+        )
+
+    def update_percentages(self):
+        answered = self.total_positive + self.total_negative
+        self.positive_percentage = self.total_positive * 100 / answered if answered else 0
+        self.negative_percentage = self.total_negative * 100 / answered if answered else 0
+
+    def get_data(self):
+        return {
+            'total_positive': self.total_positive,
+            'total_negative': self.total_negative,
+            'positive_percentage': self.positive_percentage,
+            'negative_percentage': self.negative_percentage,
+        }
+
+
+class AnswerBinary(SummarizedAnswer):
     ANSWER_CHOICES = [
         (0, 'No answer'),
         (-1, 'No'),
@@ -205,47 +716,207 @@ class AnswerBinary(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.IntegerField(choices=ANSWER_CHOICES)
 
+    data_model = AnswerBinaryData
 
-class AnswerBinaryData(models.Model):
+    @classmethod
+    def apply_answer(cls, question_id, answer, sign=1):
+        if question_id is not None and answer is not None:
+            cls.data_model.add_answers(question_id, sign * int(answer == 1), sign * int(answer == -1))
+
+    @classmethod
+    def apply_answers(cls, answers):
+        # One update per question: {question id: [Yes answers, No answers]}
+        totals = defaultdict(lambda: [0, 0])
+        for answer in answers:
+            totals[answer.question_id][0] += int(answer.answer == 1)
+            totals[answer.question_id][1] += int(answer.answer == -1)
+        for question_id, (positive, negative) in totals.items():
+            cls.data_model.add_answers(question_id, positive, negative)
+
+
+class AnswerNumericData(models.Model):
+    # Running count, sum and sum of squares of a question's answers, kept up to date as answers are saved and
+    # deleted so that get_data() reads one row however many people have answered. The recompute_answer_stats
+    # command rebuilds them exactly from the answer rows.
     question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True)
-    total_positive = models.IntegerField(default=0)
-    total_negative = models.IntegerField(default=0)
-    positive_percentage = models.FloatField(default=0)
-    negative_percentage = models.FloatField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=40, decimal_places=4, default=0)
+    total_squares = models.DecimalField(max_digits=40, decimal_places=4, default=0)
 
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def add_answers(cls, question_id, count, total, total_squares):
+        # Applies the given deltas (negative to remove answers) with a single F() update
+        if not count:
+            return
+        if count > 0:
+            cls.objects.get_or_create(question_id=question_id)
+        cls.objects.filter(question_id=question_id).update(
+            count=F('count') + count,
+            total=F('total') + total,
+            total_squares=F('total_squares') + total_squares,
+        )
+
+    def get_data(self, output_type=float):
+        # Same results as Avg, Count and StdDev (population standard deviation) over the answers
+        if not self.count:
+            return {'mean': None, 'count': 0, 'std_dev': None}
+        mean = Decimal(self.total) / self.count
+        variance = max(Decimal(self.total_squares) / self.count - mean * mean, Decimal(0))
+        return {'mean': output_type(mean), 'count': self.count, 'std_dev': output_type(variance.sqrt())}
 
-class AnswerInteger(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    answer = models.IntegerField(null=True, blank=True)
+
+class AnswerIntegerData(AnswerNumericData):
+    pass
+
+
+class AnswerDecimalData(AnswerNumericData):
+    pass
+
+
+class AnswerHistogramBucket(models.Model):
+    # Number of a question's scale answers holding each distinct value, kept up to date by NumericAnswer so that
+    # medians, percentiles and distribution charts never read the answer tables. Scale answers have at most two
+    # decimal places, so one bucket per value is exact; charts can merge neighbouring buckets as they need.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='histogram_buckets')
+    scale_type = models.CharField(
+        max_length=30,
+        choices=[(answer_type.name, answer_type.value)
+                 for answer_type in (AnswerType.SCALE_INT, AnswerType.SCALE_DECIMAL)]
+    )
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['question', 'scale_type', 'value']
+
+    @classmethod
+    def add_answers(cls, question_id, scale_type, value, count):
+        # Adds count answers (negative to remove them) to the bucket for value
+        if not count:
+            return
+        if count > 0:
+            cls.objects.get_or_create(question_id=question_id, scale_type=scale_type, value=value)
+        cls.objects.filter(question_id=question_id, scale_type=scale_type, value=value).update(
+            count=F('count') + count
+        )
+
+    @classmethod
+    def add_bucket_counts(cls, scale_type, bucket_counts, batch_size=200):
+        # Batched add_answers() for {(question id, value): count}: creates the missing buckets in bulk, then adds
+        # the counts with one UPDATE per batch of buckets
+        bucket_counts = [(key, count) for key, count in bucket_counts.items() if count]
+        cls.objects.bulk_create([
+            cls(question_id=question_id, scale_type=scale_type, value=value)
+            for (question_id, value), count in bucket_counts if count > 0
+        ], ignore_conflicts=True, batch_size=batch_size)
+        for start in range(0, len(bucket_counts), batch_size):
+            batch = bucket_counts[start:start + batch_size]
+            conditions = [Q(question_id=question_id, value=value) for (question_id, value), _ in batch]
+            cls.objects.filter(reduce(operator.or_, conditions), scale_type=scale_type).update(
+                count=F('count') + Case(
+                    *[When(condition, then=Value(count)) for condition, (_, count) in zip(conditions, batch)],
+                    default=Value(0),
+                )
+            )
+
+
+class NumericAnswer(SummarizedAnswer):
+    # Answers summarised by an AnswerNumericData model and a histogram; output_type is the type get_data() and
+    # get_percentiles() return, matching what the aggregate functions return for the answer field.
+    output_type = float
+    scale_type = None
+
+    class Meta:
+        abstract = True
 
     @classmethod
     def get_data(cls, question):
-        answers = cls.objects.filter(question=question)
+        data = cls.data_model.objects.filter(question=question).first() or cls.data_model()
+        return data.get_data(cls.output_type)
 
-        # Calculate statistics using Django's aggregation functions
-        return answers.aggregate(
-            mean=Avg('answer'),
-            count=Count('answer'),
-            std_dev=StdDev('answer'),
-        )
+    @classmethod
+    def apply_answer(cls, question_id, answer, sign=1):
+        if question_id is not None and answer is not None:
+            answer = Decimal(answer)
+            cls.data_model.add_answers(question_id, sign, sign * answer, sign * answer * answer)
+            AnswerHistogramBucket.add_answers(question_id, cls.scale_type, answer, sign)
+
+    @classmethod
+    def apply_answers(cls, answers):
+        # One statistics update per question and one histogram update per batch of buckets
+        totals = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        bucket_counts = defaultdict(int)
+        for answer in answers:
+            if answer.answer is None:
+                continue
+            value = Decimal(answer.answer)
+            question_totals = totals[answer.question_id]
+            question_totals[0] += 1
+            question_totals[1] += value
+            question_totals[2] += value * value
+            bucket_counts[answer.question_id, value] += 1
+        for question_id, (count, total, total_squares) in totals.items():
+            cls.data_model.add_answers(question_id, count, total, total_squares)
+        AnswerHistogramBucket.add_bucket_counts(cls.scale_type, bucket_counts)
+
+    @classmethod
+    def get_histogram(cls, question):
+        # [(value, number of answers)] in ascending order of value
+        answer_field = cls._meta.get_field('answer')
+        buckets = AnswerHistogramBucket.objects.filter(
+            question=question, scale_type=cls.scale_type, count__gt=0
+        ).order_by('value').values_list('value', 'count')
+        return [(answer_field.to_python(value), count) for value, count in buckets]
+
+    @classmethod
+    def get_percentiles(cls, question, percentiles=(25, 50, 75)):
+        # {percentile: value}, interpolating linearly between the closest ranks as numpy.percentile does
+        histogram = cls.get_histogram(question)
+        cumulative_counts = list(accumulate(count for _, count in histogram))
+        if not cumulative_counts:
+            return {percentile: None for percentile in percentiles}
+
+        def value_at(index):
+            return Decimal(histogram[bisect_right(cumulative_counts, index)][0])
+
+        results = {}
+        for percentile in percentiles:
+            rank = Decimal(percentile) / 100 * (cumulative_counts[-1] - 1)
+            lower = int(rank)
+            lower_value = value_at(lower)
+            upper_value = value_at(min(lower + 1, cumulative_counts[-1] - 1))
+            results[percentile] = cls.output_type(lower_value + (upper_value - lower_value) * (rank - lower))
+        return results
+
+
+class AnswerInteger(NumericAnswer):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer = models.IntegerField(null=True, blank=True)
+
+    data_model = AnswerIntegerData
+    scale_type = AnswerType.SCALE_INT.value
 
 
-class AnswerDecimal(models.Model):
+class AnswerDecimal(NumericAnswer):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
 
-    @classmethod
-    def get_data(cls, question):
-        answers = cls.objects.filter(question=question)
+    data_model = AnswerDecimalData
+    output_type = Decimal
+    scale_type = AnswerType.SCALE_DECIMAL.value
 
-        # Calculate statistics using Django's aggregation functions
-        return answers.aggregate(
-            mean=Avg('answer'),
-            count=Count('answer'),
-            std_dev=StdDev('answer'),
-        )
+
+@receiver(post_delete, sender=AnswerBinary)
+@receiver(post_delete, sender=AnswerInteger)
+@receiver(post_delete, sender=AnswerDecimal)
+def remove_answer_from_data(sender, instance, **kwargs):
+    stored_answer = getattr(instance, '_stored_answer', None) or (instance.question_id, instance.answer)
+    sender.apply_answer(*stored_answer, sign=-1)
 
 
 class UserProfile(models.Model):
@@ -260,6 +931,27 @@ class UserProfile(models.Model):
     is_live = models.BooleanField(default=True)
     last_visited = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        # Partial on is_live because boolean filters are compiled to a bare column test, which SQLite can only
+        # match against an index condition, not an index key.
+        indexes = [
+            models.Index(fields=['id'], name='userprofile_electorate_idx',
+                         condition=models.Q(is_live=True, is_verified=True)),
+            models.Index(fields=['last_visited'], name='userprofile_live_visit_idx', condition=models.Q(is_live=True)),
+            models.Index(fields=['last_visited'], name='userprofile_idle_visit_idx', condition=models.Q(is_live=False)),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_electorate = instance.get_electorate_membership()
+        return instance
+
+    def get_electorate_membership(self):
+        # (counted as live, counted as verified and live), as used by get_live_user_count()
+        is_live = bool(self.__dict__.get('is_live'))
+        return is_live, is_live and bool(self.__dict__.get('is_verified'))
+
     def check_user_status(self):
         # Set `is_live` to False if user hasn't visited the site for USER_INACTIVE_PERIOD number of days
         if self.last_visited < timezone.now() - timedelta(days=USER_INACTIVE_PERIOD):
@@ -272,12 +964,92 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+class SharedCounter(models.Model):
+    # Named integers kept in the database so that every worker process reads and adjusts the same value;
+    # the default cache is local to each process and would let their copies drift apart.
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField()
+
+    @classmethod
+    def get_value(cls, name, default):
+        # Returns the counter's value, creating it from default() if it doesn't exist yet
+        value = cls.objects.filter(name=name).values_list('value', flat=True).first()
+        if value is None:
+            value = cls.objects.get_or_create(name=name, defaults={'value': default()})[0].value
+        return value
+
+    @classmethod
+    def add(cls, name, delta):
+        # Adds delta to an existing counter; returns False if there is no such counter
+        return bool(cls.objects.filter(name=name).update(value=F('value') + delta))
+
+    @classmethod
+    def reset(cls, *names):
+        # Drops the counters so that the next get_value() recomputes them
+        cls.objects.filter(name__in=names).delete()
+
+
+LIVE_USER_COUNT_COUNTER = 'live_user_count'
+VERIFIED_LIVE_USER_COUNT_COUNTER = 'verified_live_user_count'
+
+
+def get_live_user_count(verified_only=False):
+    # The electorate size is kept in a SharedCounter and adjusted by the UserProfile signals below,
+    # so participation percentages don't need to count the UserProfile table on every vote.
+    if verified_only:
+        return SharedCounter.get_value(
+            VERIFIED_LIVE_USER_COUNT_COUNTER, UserProfile.objects.filter(is_live=True, is_verified=True).count
+        )
+    return SharedCounter.get_value(LIVE_USER_COUNT_COUNTER, UserProfile.objects.filter(is_live=True).count)
+
+
+def adjust_live_user_count(live_delta, verified_live_delta=0):
+    for name, delta in ((LIVE_USER_COUNT_COUNTER, live_delta),
+                        (VERIFIED_LIVE_USER_COUNT_COUNTER, verified_live_delta)):
+        if delta:
+            SharedCounter.add(name, delta)  # when not stored yet, the next read counts the table
+
+    if live_delta:
+        new_total_users = get_live_user_count()
+        if queue_participation_reevaluation(new_total_users - live_delta, new_total_users):
+            transaction.on_commit(process_reevaluation_queue)
+
+
+def invalidate_live_user_count():
+    SharedCounter.reset(LIVE_USER_COUNT_COUNTER, VERIFIED_LIVE_USER_COUNT_COUNTER)
+
+
+@receiver(post_save, sender=UserProfile)
+def update_live_user_count(sender, instance, created, **kwargs):
+    new_membership = instance.get_electorate_membership()
+    if created:
+        old_membership = (False, False)
+    elif hasattr(instance, '_stored_electorate'):
+        old_membership = instance._stored_electorate
+    else:
+        # Saved without having been loaded, so there is nothing reliable to compare against
+        invalidate_live_user_count()
+        instance._stored_electorate = new_membership
+        return
+
+    adjust_live_user_count(
+        int(new_membership[0]) - int(old_membership[0]),
+        int(new_membership[1]) - int(old_membership[1]),
+    )
+    instance._stored_electorate = new_membership
+
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_live_user_count(sender, instance, **kwargs):
+    is_live, is_verified_live = getattr(instance, '_stored_electorate', instance.get_electorate_membership())
+    adjust_live_user_count(-int(is_live), -int(is_verified_live))
+
+
 @receiver(user_logged_in, sender=User)
 def update_last_visit(sender, user, request, **kwargs):
     profile = UserProfile.objects.get(user=user)
     profile.last_visited = timezone.now()
-    profile.check_user_status()  # calling check_user_status when user logs in
-    profile.save()
+    profile.check_user_status()  # saves the profile, which also updates the live user count
 
 
 user_logged_in.connect(update_last_visit)
@@ -1,33 +1,133 @@
 import re
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
-from app01.models import KeyWord
-import nltk
-from nltk.tokenize import word_tokenize
+from app01.models import KeyWord, get_keyword_vocabulary_version, highlighted_definition_cache_key, normalize_keyword
+register = template.Library()
 
-nltk.download('punkt', quiet=True)
+TOKEN_PATTERN = re.compile(r"[\w']+|[.,!?;]")
+STRIP_PATTERN = re.compile(r"^\W+|\W+$")
+LINKED_STATUSES = {'Approved': 'approved', 'Proposed': 'proposed', 'Rejected': 'rejected'}
 
-register = template.Library()
+# Trie of case-folded keyword tokens, built once from the KeyWord table and rebuilt whenever the keyword
+# vocabulary version changes. Each node maps a token to its child node; the KEYWORD_ENTRY key holds
+# (word, status, url) for the keyword that ends at that node.
+KEYWORD_ENTRY = None
+_keyword_trie = None
+_keyword_trie_version = None
+
+HIGHLIGHTED_DEFINITION_TIMEOUT = 60 * 60 * 24  # seconds
+
+
+def regex_tokenize(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+def nltk_tokenize(text):
+    # NLTK is only imported when configured, and its punkt data must already be installed
+    # (python -m nltk.downloader punkt); nothing is downloaded at runtime.
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text)
+
+
+TOKENIZERS = {
+    'regex': regex_tokenize,
+    'nltk': nltk_tokenize,
+}
+
+
+def tokenize(text):
+    return TOKENIZERS[getattr(settings, 'KEYWORD_TOKENIZER', 'regex')](text)
+
+
+def clean_token(token):
+    # Remove leading/trailing punctuation
+    return STRIP_PATTERN.sub("", token)
+
+
+def build_keyword_trie():
+    trie = {}
+    for keyword in KeyWord.objects.only('word', 'status').order_by('id'):
+        tokens = [clean_token(token) for token in tokenize(keyword.word)]
+        if not tokens or not all(token.isalnum() for token in tokens):
+            continue  # could never match a run of words in the text
+        node = trie
+        for token in tokens:
+            node = node.setdefault(normalize_keyword(token), {})
+        node.setdefault(KEYWORD_ENTRY, (keyword.word, keyword.status, keyword.get_absolute_url()))
+    return trie
+
+
+def get_keyword_trie():
+    global _keyword_trie, _keyword_trie_version
+    version = get_keyword_vocabulary_version()
+    if _keyword_trie is None or _keyword_trie_version != version:
+        _keyword_trie = build_keyword_trie()
+        _keyword_trie_version = version
+    return _keyword_trie
+
+
+def keyword_link(keyword, data_word):
+    word, status, url = keyword
+    return f'<a href="{url}" class="keyword {LINKED_STATUSES[status]}" data-word="{data_word}">{word}</a>'
+
+
+def match_phrase(trie, clean_words, start):
+    # Longest multi-word keyword with a linked status starting at clean_words[start], as (end, keyword)
+    match = None
+    node = trie
+    for end in range(start, len(clean_words)):
+        if not clean_words[end].isalnum():
+            break
+        node = node.get(normalize_keyword(clean_words[end]))
+        if node is None:
+            break
+        keyword = node.get(KEYWORD_ENTRY)
+        if end > start and keyword is not None and keyword[1] in LINKED_STATUSES:
+            match = (end + 1, keyword)
+    return match
 
 
 @register.filter(is_safe=True)
 def highlight_keywords(text):
-    words = re.findall(r"[\w']+|[.,!?;]", text)
-    for i, word in enumerate(words):
-        # Remove leading/trailing punctuation
-        clean_word = re.sub(r"^\W+|\W+$", "", word)
+    trie = get_keyword_trie()
+    words = tokenize(text)
+    clean_words = [clean_token(word) for word in words]
+    highlighted = []
+    i = 0
+    while i < len(words):
+        word, clean_word = words[i], clean_words[i]
+        phrase = match_phrase(trie, clean_words, i)
+        if phrase is not None:
+            end, keyword = phrase
+            prefix = words[i][:words[i].index(clean_words[i])]
+            suffix = words[end - 1][words[end - 1].rindex(clean_words[end - 1]) + len(clean_words[end - 1]):]
+            highlighted.append(prefix + keyword_link(keyword, ' '.join(clean_words[i:end])) + suffix)
+            i = end
+            continue
         if clean_word.isalnum():
-            try:
-                keyword = KeyWord.objects.get(word__iexact=clean_word)
-                if keyword.status == 'Approved':
-                    words[i] = word.replace(clean_word, f'<a href="{keyword.get_absolute_url()}" class="keyword approved" data-word="{clean_word}">{keyword.word}</a>')
-                elif keyword.status == 'Proposed':
-                    words[i] = word.replace(clean_word, f'<a href="{keyword.get_absolute_url()}" class="keyword proposed" data-word="{clean_word}">{keyword.word}</a>')
-                elif keyword.status == 'Rejected':
-                    words[i] = word.replace(clean_word, f'<a href="{keyword.get_absolute_url()}" class="keyword rejected" data-word="{clean_word}">{keyword.word}</a>')
-            except KeyWord.DoesNotExist:
-                words[i] = f'<span data-word="{clean_word}">{clean_word}</span>'
-    result = ' '.join(words)
+            keyword = trie.get(normalize_keyword(clean_word), {}).get(KEYWORD_ENTRY)
+            if keyword is None:
+                word = f'<span data-word="{clean_word}">{clean_word}</span>'
+            elif keyword[1] in LINKED_STATUSES:
+                word = word.replace(clean_word, keyword_link(keyword, clean_word))
+        highlighted.append(word)
+        i += 1
+    result = ' '.join(highlighted)
     # post-processing to remove unwanted spaces
     result = result.replace(" ,", ",").replace(" .", ".").replace(" !", "!").replace(" ?", "?").replace(" ;", ";")
     return mark_safe(result)
+
+
+@register.filter(is_safe=True)
+def highlight_definition(keyword_definition):
+    # Highlighted definitions are cached per definition text and keyword vocabulary version, so they are
+    # only rendered again after the text is edited or a keyword is added, removed or changes status.
+    version = get_keyword_vocabulary_version()
+    cache_key = highlighted_definition_cache_key(keyword_definition, version)
+    result = cache.get(cache_key)
+    if result is None:
+        result = str(highlight_keywords(keyword_definition.definition))
+        cache.set(cache_key, result, HIGHLIGHTED_DEFINITION_TIMEOUT)
+    return mark_safe(result)
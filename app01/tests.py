@@ -1,3 +1,486 @@
-from django.test import TestCase
+import importlib.util
+import io
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Avg, Count, F, Q, StdDev
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .answers import ingest_answers
+from .models import USER_INACTIVE_PERIOD, VOTE_TALLY_FIELDS, AnswerBinary, AnswerBinaryData, AnswerDecimal, \
+    AnswerHistogramBucket, AnswerInteger, AnswerType, BufferedVote, KeyWord, Question, QuestionTag, Status, \
+    UserProfile, Vote, VoteType, get_live_user_count
+from .voting import CAST_VOTE_QUERY_BUDGET, buffer_vote, cast_vote, compact_vote_counter_shards, flush_vote_buffer, \
+    pending_tally_deltas, supports_vote_upsert
+from .templatetags.highlight_keywords import highlight_keywords
+
+# Transaction control statements, which tests that count queries leave out
+TRANSACTION_STATEMENT = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+
+class HighlighterStartupTests(SimpleTestCase):
+    # Startup benchmark for the keyword highlighter: each import is timed in a fresh interpreter after
+    # django.setup(), as a worker would load the template library on boot.
+
+    def time_import(self, module, runs=3):
+        code = (
+            'import sys, time, django; django.setup(); '
+            f'started = time.perf_counter(); import {module}; '
+            'print(time.perf_counter() - started, "nltk" in sys.modules)'
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='project01.settings')
+        timings = []
+        for _ in range(runs):
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                    cwd=settings.BASE_DIR, env=env)
+            elapsed, nltk_loaded = result.stdout.splitlines()[-1].split()
+            timings.append(float(elapsed))
+        return min(timings), nltk_loaded == 'True'
+
+    def test_highlighter_import_does_not_load_nltk(self):
+        _, nltk_loaded = self.time_import('app01.templatetags.highlight_keywords', runs=1)
+        self.assertFalse(nltk_loaded)
+
+    @skipUnless(importlib.util.find_spec('nltk'), 'NLTK is not installed')
+    def test_highlighter_import_is_faster_than_nltk_import(self):
+        # Importing the highlighter used to import NLTK (and check for punkt), so it cost at least this much
+        highlighter_time, _ = self.time_import('app01.templatetags.highlight_keywords')
+        nltk_time, _ = self.time_import('nltk')
+        self.assertLess(highlighter_time, nltk_time)
+
+
+
+class HighlightKeywordsTests(TestCase):
+    # Single-word output must stay the markup of the original per-word implementation
+
+    def setUp(self):
+        user = User.objects.create_user('author')
+        for word, status in [('democracy', Status.APPROVED), ('Freedom', Status.PROPOSED),
+                             ('equality', Status.REJECTED), ('alternate', Status.ALTERNATIVE),
+                             ('civil rights', Status.APPROVED)]:
+            KeyWord.objects.create(word=word, status=status.value, creator=user)
+
+    def test_single_word_markup_is_unchanged(self):
+        text = "Democracy, freedom and equality! Is the alternate fair? Don't panic; DEMOCRACY."
+        self.assertEqual(highlight_keywords(text), (
+            '<a href="/keyword/democracy/" class="keyword approved" data-word="Democracy">democracy</a>, '
+            '<a href="/keyword/Freedom/" class="keyword proposed" data-word="freedom">Freedom</a> '
+            '<span data-word="and">and</span> '
+            '<a href="/keyword/equality/" class="keyword rejected" data-word="equality">equality</a>! '
+            '<span data-word="Is">Is</span> <span data-word="the">the</span> alternate '
+            '<span data-word="fair">fair</span>? Don\'t <span data-word="panic">panic</span>; '
+            '<a href="/keyword/democracy/" class="keyword approved" data-word="DEMOCRACY">democracy</a>.'
+        ))
+
+    def test_multi_word_keyword_is_linked(self):
+        self.assertEqual(highlight_keywords('Civil rights, and civil duties.'), (
+            '<a href="/keyword/civil%20rights/" class="keyword approved" data-word="Civil rights">civil rights</a>, '
+            '<span data-word="and">and</span> <span data-word="civil">civil</span> '
+            '<span data-word="duties">duties</span>.'
+        ))
+
+
+def create_users(count, prefix='voter'):
+    return [User.objects.create_user(f'{prefix}{number}') for number in range(count)]
+
+
+def create_question(creator, answer_type):
+    # Questions and their tags reference each other, so the tag is pointed at its question afterwards
+    tag = QuestionTag.objects.create(creator=creator, question_id=0)
+    question = Question.objects.create(creator=creator, question_tag=tag, question_text='How many?',
+                                       answer_type=answer_type.name)
+    tag.question = question
+    tag.save(update_fields=['question'])
+    return question
+
+
+class VotableTreeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author')
+
+    def create_keyword(self, word, parent=None):
+        return KeyWord.objects.create(word=word, creator=self.user, parent=parent)
+
+    def test_save_keeps_path_rewritten_by_ancestor_move(self):
+        root = self.create_keyword('root')
+        branch = self.create_keyword('branch', parent=root)
+        leaf = KeyWord.objects.get(pk=self.create_keyword('leaf', parent=branch).pk)
+        other_root = self.create_keyword('other root')
+
+        branch.parent = other_root
+        branch.save()
+        leaf.save()  # loaded before the move, so its in-memory path is stale
+
+        self.assertEqual(KeyWord.objects.get(pk=leaf.pk).path, f'{other_root.pk}/{branch.pk}/{leaf.pk}/')
+        self.assertIn(leaf, other_root.get_descendants())
+
+    def test_path_is_not_limited_in_depth(self):
+        keyword = None
+        for depth in range(100):
+            keyword = self.create_keyword(f'level {depth}', parent=keyword)
+        self.assertGreater(len(keyword.path), 255)
+        self.assertEqual(keyword.get_ancestors().count(), 99)
+
+
+class BinaryAnswerDataTests(TestCase):
+
+    def test_recompute_answer_stats_repairs_drift(self):
+        users = create_users(5)
+        questions = [create_question(users[0], AnswerType.BINARY) for _ in range(2)]
+        for user, answer in zip(users, [1, 1, -1, 0, 1]):
+            AnswerBinary.objects.create(user=user, question=questions[0], answer=answer)
+        AnswerBinary.objects.create(user=users[0], question=questions[1], answer=-1)
+        AnswerBinaryData.objects.filter(question=questions[0]).update(total_positive=9, positive_percentage=90)
+        AnswerBinaryData.objects.filter(question=questions[1]).delete()
+
+        call_command('recompute_answer_stats', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(AnswerBinary.get_data(questions[0]), {
+            'total_positive': 3, 'total_negative': 1, 'positive_percentage': 75, 'negative_percentage': 25,
+        })
+        self.assertEqual(AnswerBinary.get_data(questions[1])['total_negative'], 1)
+
+
+class IngestAnswersTests(TestCase):
+
+    def test_ids_must_be_integers(self):
+        user = User.objects.create_user('respondent')
+        question = create_question(user, AnswerType.SCALE_INT)
+        rows = [
+            {'user': user.pk, 'question': question.pk, 'answer': 4},
+            {'user': str(user.pk), 'question': str(question.pk), 'answer': '5'},
+            {'user': user.pk, 'question': question.pk + 0.7, 'answer': 6},
+            {'user': user.pk, 'question': float(question.pk), 'answer': 7},
+            {'user': True, 'question': question.pk, 'answer': 8},
+        ]
+        result = ingest_answers(rows)
+        self.assertEqual((result['created'], result['invalid']), (2, 3))
+        self.assertEqual(sorted(AnswerInteger.objects.values_list('answer', flat=True)), [4, 5])
+
+
+class NumericAnswerDataTests(TestCase):
+    # get_data() reads statistics maintained answer by answer; they must match aggregates over the answers
+
+    def setUp(self):
+        self.users = create_users(6)
+
+    def assert_data_matches_aggregates(self, model):
+        for question in self.questions:
+            expected = model.objects.filter(question=question, answer__isnull=False).aggregate(
+                mean=Avg('answer'), count=Count('answer'), std_dev=StdDev('answer'),
+            )
+            data = model.get_data(question)
+            self.assertEqual(data['count'], expected['count'])
+            for statistic in ('mean', 'std_dev'):
+                if expected[statistic] is None:
+                    self.assertIsNone(data[statistic])
+                else:
+                    self.assertIsInstance(data[statistic], model.output_type)
+                    self.assertAlmostEqual(float(data[statistic]), float(expected[statistic]), places=6)
+
+    def check_answer_changes(self, model, values):
+        # Answers are created, changed, withdrawn, moved to another question and deleted
+        self.questions = [create_question(self.users[0], AnswerType(model.scale_type)) for _ in range(2)]
+        first, second = self.questions
+        answers = [model.objects.create(user=user, question=first, answer=value)
+                   for user, value in zip(self.users, values)]
+        model.objects.create(user=self.users[-1], question=first, answer=None)
+        self.assert_data_matches_aggregates(model)
+
+        answers[0].answer = values[-1]
+        answers[0].save()
+        answers[1].answer = None
+        answers[1].save()
+        self.assert_data_matches_aggregates(model)
+
+        answers[2].question = second
+        answers[2].save()
+        answer = model.objects.get(pk=answers[3].pk)
+        answer.question = second
+        answer.answer = values[0]
+        answer.save()
+        self.assert_data_matches_aggregates(model)
+
+        answers[4].delete()
+        model.objects.get(pk=answers[2].pk).delete()
+        self.assert_data_matches_aggregates(model)
+
+    def test_recompute_answer_stats_repairs_drift(self):
+        self.check_answer_changes(AnswerInteger, [3, 7, -2, 10, 4])
+        first, second = self.questions
+        AnswerInteger.data_model.objects.filter(question=first).update(count=50, total=1)
+        AnswerInteger.data_model.objects.filter(question=second).delete()
+        call_command('recompute_answer_stats', batch_size=1, stdout=io.StringIO())
+        self.assert_data_matches_aggregates(AnswerInteger)
+
+    def test_rebuild_answer_histograms_repairs_drift(self):
+        self.check_answer_changes(AnswerDecimal, [Decimal('2.50'), Decimal('2.50'), Decimal('-3.25'),
+                                                  Decimal('9.99'), Decimal('2.50')])
+        first, second = self.questions
+        AnswerHistogramBucket.objects.filter(question=first).update(count=F('count') + 5)
+        AnswerHistogramBucket.objects.filter(question=second).delete()
+        AnswerHistogramBucket.objects.create(question=create_question(self.users[0], AnswerType.SCALE_DECIMAL),
+                                             scale_type=AnswerDecimal.scale_type, value=1, count=3)
+        call_command('rebuild_answer_histograms', batch_size=2, stdout=io.StringIO())
+
+        for question in Question.objects.all():
+            answers = AnswerDecimal.objects.filter(question=question, answer__isnull=False)
+            self.assertEqual(AnswerDecimal.get_histogram(question),
+                             sorted(Counter(answers.values_list('answer', flat=True)).items()))
+
+    def test_integer_data_matches_aggregates(self):
+        self.check_answer_changes(AnswerInteger, [3, 7, -2, 10, 4])
+
+    def test_decimal_data_matches_aggregates(self):
+        self.check_answer_changes(AnswerDecimal, [Decimal('2.50'), Decimal('0.75'), Decimal('-3.25'),
+                                                  Decimal('9.99'), Decimal('4.00')])
+
+
+@override_settings(VOTE_WRITE_BEHIND=False, VOTE_COUNTER_SHARDS=0)
+class CastVoteTests(TestCase):
+
+    def setUp(self):
+        self.users = create_users(10)
+        self.keyword = KeyWord.objects.create(word='ballot', creator=self.users[0])
+        self.content_type = ContentType.objects.get_for_model(KeyWord)
+
+    def test_vote_on_unknown_object_is_not_found(self):
+        self.client.force_login(self.users[0])
+        for write_behind in (False, True):
+            with self.settings(VOTE_WRITE_BEHIND=write_behind):
+                response = self.client.post(reverse('app01:submit_vote'), {
+                    'votable_content_type': self.content_type.pk,
+                    'votable_object_id': self.keyword.pk + 100,
+                    'vote': VoteType.APPROVE.value,
+                })
+            self.assertEqual(response.status_code, 404)
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(BufferedVote.objects.exists())
+
+    def test_cast_vote_stays_within_query_budget(self):
+        get_live_user_count()  # stored by the first vote on a fresh database
+        budget = CAST_VOTE_QUERY_BUDGET + (not supports_vote_upsert())
+        # One voter in ten changes neither the participation threshold nor the status
+        for vote in (VoteType.APPROVE, VoteType.REJECT, VoteType.NO_VOTE):
+            with CaptureQueriesContext(connection) as queries:
+                cast_vote(self.users[0], self.content_type, self.keyword.pk, vote.value)
+            statements = [query['sql'] for query in queries if not TRANSACTION_STATEMENT.match(query['sql'])]
+            self.assertLessEqual(len(statements), budget, '\n'.join(statements))
+
+
+@override_settings(VOTE_WRITE_BEHIND=True, VOTE_COUNTER_SHARDS=0)
+class VoteBufferTests(TestCase):
+
+    def setUp(self):
+        self.users = create_users(6)
+        self.keyword = KeyWord.objects.create(word='ballot', creator=self.users[0])
+        self.content_type = ContentType.objects.get_for_model(KeyWord)
+
+    def test_pending_deltas_match_flushed_counters(self):
+        cast_vote(self.users[0], self.content_type, self.keyword.pk, VoteType.REJECT.value)
+        flush_vote_buffer()
+        votes = [VoteType.APPROVE, VoteType.REJECT, VoteType.APPROVE, VoteType.NO_VOTE, VoteType.APPROVE]
+        for turn, vote in enumerate(votes):
+            for user in self.users[turn:]:
+                buffer_vote(user, self.content_type, self.keyword.pk, vote.value)
+
+        self.keyword.refresh_from_db()
+        pending = pending_tally_deltas(self.keyword)
+        expected = [getattr(self.keyword, field) + delta for field, delta in zip(VOTE_TALLY_FIELDS, pending)]
+        flush_vote_buffer()
+        self.keyword.refresh_from_db()
+        self.assertEqual([getattr(self.keyword, field) for field in VOTE_TALLY_FIELDS], expected)
+
+    def test_pending_deltas_take_one_query_whatever_the_buffer_size(self):
+        for user in self.users:
+            buffer_vote(user, self.content_type, self.keyword.pk, VoteType.APPROVE.value)
+        ContentType.objects.get_for_model(KeyWord)
+        with self.assertNumQueries(1):
+            self.assertEqual(pending_tally_deltas(self.keyword), (len(self.users), len(self.users), 0))
+
+
+class PendingVoteListingTests(TestCase):
+    # List pages and the JSON API add votes not yet folded into the counters
+
+    def setUp(self):
+        self.users = create_users(4)
+        self.question = create_question(self.users[0], AnswerType.BINARY)
+        self.content_type = ContentType.objects.get_for_model(Question)
+        self.client.force_login(self.users[0])
+
+    def listed_totals(self):
+        response = self.client.get(reverse('app01:changes_json'), {'status': 'proposed'})
+        [result] = response.json()['results']
+        return [result[field] for field in VOTE_TALLY_FIELDS]
+
+    def cast_votes(self):
+        for user, vote in zip(self.users, [VoteType.APPROVE, VoteType.APPROVE, VoteType.REJECT]):
+            cast_vote(user, self.content_type, self.question.pk, vote.value)
+
+    @override_settings(VOTE_WRITE_BEHIND=False, VOTE_COUNTER_SHARDS=4)
+    def test_listing_includes_counter_shards(self):
+        self.cast_votes()
+        self.assertEqual(self.listed_totals(), [3, 2, 1])
+
+    @override_settings(VOTE_WRITE_BEHIND=True, VOTE_COUNTER_SHARDS=0)
+    def test_listing_includes_buffered_votes(self):
+        self.cast_votes()
+        self.assertEqual(self.listed_totals(), [3, 2, 1])
+        for page in ('app01:proposed_changes', 'app01:approved_changes'):
+            self.assertEqual(self.client.get(reverse(page)).status_code, 200)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN output is checked for SQLite and PostgreSQL')
+class QueryPlanTests(TestCase):
+    # The hot queries must be planned on their indexes. PostgreSQL would scan tables this small, so sequential
+    # scans are switched off for the test transaction; the plan then names an index if one applies.
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_vote_tally_uses_votable_index(self):
+        keyword = KeyWord.objects.create(word='ballot', creator=User.objects.create_user('voter'))
+        votes = keyword.get_votes().exclude(vote=VoteType.NO_VOTE.value)
+        self.assertIn('vote_votable_cast_idx', self.explain(votes))
+
+    def test_status_listing_uses_status_index(self):
+        questions = Question.objects.filter(status=Status.APPROVED.value, id__gt=0).order_by('id')
+        self.assertIn('question_status_idx', self.explain(questions))
+
+    def test_user_status_sweeps_use_partial_indexes(self):
+        cutoff = timezone.now() - timedelta(days=USER_INACTIVE_PERIOD)
+        expired = UserProfile.objects.filter(is_live=True, last_visited__lt=cutoff)
+        revived = UserProfile.objects.filter(is_live=False, last_visited__gte=cutoff)
+        self.assertIn('userprofile_live_visit_idx', self.explain(expired))
+        self.assertIn('userprofile_idle_visit_idx', self.explain(revived))
+
+    def test_electorate_count_uses_an_index(self):
+        electorate = UserProfile.objects.filter(is_live=True, is_verified=True)
+        self.assertRegex(self.explain(electorate), r'userprofile_\w+_idx')
+
+
+@override_settings(VOTE_WRITE_BEHIND=False, VOTE_COUNTER_SHARDS=4)
+class CounterShardTests(TestCase):
+    # Recounts already include the votes held in counter shards, so compacting afterwards must add nothing
+
+    def setUp(self):
+        self.users = create_users(5)
+        self.keyword = KeyWord.objects.create(word='ballot', creator=self.users[0])
+        content_type = ContentType.objects.get_for_model(KeyWord)
+        for user in self.users:
+            cast_vote(user, content_type, self.keyword.pk, VoteType.APPROVE.value)
+
+    def assert_votes_after_compaction(self, total_votes):
+        compact_vote_counter_shards()
+        self.keyword.refresh_from_db()
+        self.assertEqual((self.keyword.total_votes, self.keyword.total_approve_votes), (total_votes, total_votes))
+
+    def test_reconcile_votes_drops_counter_shards(self):
+        self.keyword.refresh_from_db()
+        self.keyword.reconcile_votes()
+        self.assert_votes_after_compaction(len(self.users))
+
+    def test_recompute_votable_stats_drops_counter_shards(self):
+        call_command('recompute_votable_stats', stdout=io.StringIO())
+        self.assert_votes_after_compaction(len(self.users))
+
+
+@override_settings(VOTE_WRITE_BEHIND=False, VOTE_COUNTER_SHARDS=0)
+class ConcurrentVoteTests(TransactionTestCase):
+    # Votes cast from several threads at once, each with its own database connection
+    THREADS = 16
+    VOTES_PER_THREAD = 5
+
+    def setUp(self):
+        self.users = create_users(self.THREADS)
+        self.keyword = KeyWord.objects.create(word='ballot', creator=self.users[0])
+        self.content_type = ContentType.objects.get_for_model(KeyWord)
+
+    def cast_votes_in_threads(self, votes_for_user):
+        # Runs cast_vote() for every vote in votes_for_user(user), one thread per user, and returns the errors
+        errors = []
+        start = threading.Barrier(len(self.users))
+
+        def vote(user):
+            try:
+                start.wait()
+                for vote_value in votes_for_user(user):
+                    cast_vote(user, self.content_type, self.keyword.pk, vote_value)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_votes_do_not_fail(self):
+        # Transactions that read before writing used to fail with "database is locked" on SQLite
+        votes = ([VoteType.APPROVE.value, VoteType.REJECT.value] * self.VOTES_PER_THREAD)[:self.VOTES_PER_THREAD]
+        errors = self.cast_votes_in_threads(lambda user: votes)
+        self.assertEqual(errors, [])
+
+    def test_concurrent_votes_keep_counters_exact(self):
+        # Each user changes their vote several times, sometimes repeating it or withdrawing it
+        choices = [vote.value for vote in VoteType]
+        errors = self.cast_votes_in_threads(
+            lambda user: [random.Random(user.pk * 31 + turn).choice(choices) for turn in range(self.VOTES_PER_THREAD)]
+        )
+        self.assertEqual(errors, [])
+
+        recount = self.keyword.get_votes().aggregate(
+            total_approve_votes=Count('id', filter=Q(vote=VoteType.APPROVE.value)),
+            total_reject_votes=Count('id', filter=Q(vote=VoteType.REJECT.value)),
+        )
+        recount['total_votes'] = recount['total_approve_votes'] + recount['total_reject_votes']
+        self.keyword.refresh_from_db()
+        self.assertEqual({field: getattr(self.keyword, field) for field in recount}, recount)
+
+    def test_concurrent_flushes_apply_the_latest_vote(self):
+        # Flushers that skipped each other's locked batches could apply an older buffered vote after a newer one
+        for vote in (VoteType.REJECT, VoteType.APPROVE):
+            for user in self.users:
+                buffer_vote(user, self.content_type, self.keyword.pk, vote.value)
+        errors = []
+
+        def flush():
+            try:
+                flush_vote_buffer(batch_size=3)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=flush) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(set(self.keyword.get_votes().values_list('vote', flat=True)), {VoteType.APPROVE.value})
+        self.keyword.refresh_from_db()
+        self.assertEqual(self.keyword.total_approve_votes, len(self.users))
@@ -20,7 +20,10 @@ urlpatterns = [
     path('submit_vote/', views.submit_vote, name='submit_vote'),
     path('question_detail/<int:pk>/', views.QuestionDetailView.as_view(), name='question_detail'),
     path('approved_changes/', views.ApprovedChangesView.as_view(), name='approved_changes'),
+    path('changes_json/', views.changes_json, name='changes_json'),
     path('update_status/<int:pk>/', views.update_status, name='update_status'),
+    path('ingest_answers/', views.ingest_answers_view, name='ingest_answers'),
+    path('export/<str:table>/', views.export_view, name='export'),
 
 ]
 
@@ -1,22 +1,36 @@
-from django.core.exceptions import ObjectDoesNotExist
+import codecs
+import json
+from collections import defaultdict
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Count
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from . import models
-from .models import UserProfile, Status, VoteType, KeyWord, KeyWordDefinition, QuestionTag, Question, Vote
+from .models import Status, VoteType, KeyWord, KeyWordDefinition, QuestionTag, Question, get_live_user_count, \
+    get_keyword_tree_version, normalize_keyword, vote_label
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from .forms import UserRegisterForm, UserProfileForm, UsernameForm, LoginForm, ProposeQuestionForm, VoteForm
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, Http404, HttpResponseNotAllowed
+from django.http import JsonResponse, HttpResponse, Http404, HttpResponseNotAllowed, HttpResponseBadRequest, \
+    StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import ListView
 from django.contrib.auth.models import User, ContentType
 from django.shortcuts import get_object_or_404
 from django.views.generic import DetailView
 from django.http import HttpResponseForbidden
-from .forms import KeyWordForm, QuestionForm
+from .forms import KeyWordForm, QuestionForm, ChangeStatusForm
+from .answers import ANSWER_READERS, INGEST_CHUNK_SIZE, ingest_answers
+from .exports import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, EXPORT_TABLES, export_lines
+from .voting import cast_vote, merge_counter_shards, merge_pending_tallies, merge_pending_votes, vote_payload
 from django import forms
 from django.shortcuts import render
 from django.shortcuts import redirect
@@ -28,57 +42,77 @@ def submit_vote(request):
     if request.method == 'POST':
         form = VoteForm(request.POST, user=request.user)
         if form.is_valid():
-            # Extract the user, votable_content_type, and votable_object_id from the form
-            user = request.user
             votable_content_type = form.cleaned_data['votable_content_type']
             votable_object_id = form.cleaned_data['votable_object_id']
-            vote_value = form.cleaned_data['vote']
+            vote_value = int(form.cleaned_data['vote'] or VoteType.NO_VOTE.value)
 
-            # Try to get an existing vote from this user for this object
+            # Save or remove the vote and update the tally in one transaction, then answer from memory. An
+            # unknown object is only found out inside that transaction, which then rolls back the vote.
             try:
-                vote = Vote.objects.get(user=user, votable_content_type=votable_content_type, votable_object_id=votable_object_id)
-            except Vote.DoesNotExist:
-                vote = None
-
-            if vote_value == VoteType.NO_VOTE.value:
-                # If the user selected "No Vote", delete the vote if it exists
-                if vote:
-                    vote.delete()
-            else:
-                # If the user selected approve or reject, update the existing vote or create a new one
-                if vote:
-                    vote.vote = vote_value
-                    vote.save()
-                else:
-                    form.save()
-
-            votable_object = votable_content_type.get_object_for_this_type(id=votable_object_id)
-            new_status = votable_object.calculate_status()
-            user_vote = votable_object.get_user_vote(request.user)
-
-            data = {
-                'total_votes': votable_object.get_votes().exclude(vote=VoteType.NO_VOTE.value).count(),
-                'status': new_status,
-                'user_vote': user_vote,
-                'approval_percentage': votable_object.approval_percentage,
-                'rejection_percentage': 100 - votable_object.approval_percentage,
-                'participation_percentage': votable_object.participation_percentage,
-                'total_approve_votes': votable_object.total_approve_votes,  # added
-                'total_reject_votes': votable_object.total_reject_votes,  # added
-            }
-
-            return JsonResponse(data)
+                votable_object = cast_vote(request.user, votable_content_type, votable_object_id, vote_value)
+            except votable_content_type.model_class().DoesNotExist:
+                raise Http404('No such votable object.')
+            return JsonResponse(vote_payload(votable_object, vote_value))
 
+        return HttpResponseBadRequest(form.errors.as_json(), content_type='application/json')
+
+    return HttpResponseNotAllowed(['POST'])
+
+
+# Request content types accepted by ingest_answers_view and the reader for each
+INGEST_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+@login_required
+def ingest_answers_view(request):
+    # Staff-only bulk import of answers; the body is streamed through the reader rather than loaded whole
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    if request.method != 'POST':
         return HttpResponseNotAllowed(['POST'])
 
+    input_format = INGEST_CONTENT_TYPES.get(request.content_type)
+    if input_format is None:
+        return JsonResponse({'error': f'Content-Type must be one of {", ".join(INGEST_CONTENT_TYPES)}'}, status=415)
+    chunk_size = request.GET.get('chunk_size', str(INGEST_CHUNK_SIZE))
+    if not chunk_size.isdigit() or int(chunk_size) < 1:
+        return HttpResponseBadRequest("Invalid 'chunk_size' parameter.")
+
+    lines = codecs.iterdecode(request, request.encoding or 'utf-8')
+    return JsonResponse(ingest_answers(ANSWER_READERS[input_format](lines), int(chunk_size)))
+
+
+@login_required
+def export_view(request, table):
+    # Staff-only streaming export of votes or answers (?format=csv|ndjson)
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    if table not in EXPORT_TABLES:
+        raise Http404("Unknown export.")
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Invalid 'format' parameter.")
+
+    response = StreamingHttpResponse(export_lines(table, export_format),
+                                     content_type=EXPORT_CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{table}.{export_format}"'
+    return response
+
 
 @login_required
 def keyword_detail(request, keyword):
     # Fetch the keyword from the database
-    keyword_obj = get_object_or_404(KeyWord, word=keyword)
+    keyword_obj = get_object_or_404(KeyWord, word_key=normalize_keyword(keyword))
+    if settings.VOTE_COUNTER_SHARDS:
+        merge_counter_shards(keyword_obj)  # include votes not yet compacted from the counter shards
+    if settings.VOTE_WRITE_BEHIND:
+        merge_pending_votes(keyword_obj)  # include votes still waiting in the buffer
     keyword_form = None
     keyword_error = None
-    vote = None
 
     # Fetch the content type for the keyword model
     votable_content_type = ContentType.objects.get_for_model(keyword_obj)
@@ -95,21 +129,14 @@ def keyword_detail(request, keyword):
         elif 'vote_submit' in request.POST:  # This is a vote form submission
             vote_value = request.POST.get('vote')
             if vote_value:
-                vote_value = int(vote_value)
-                if vote:
-                    vote.vote = vote_value
-                    vote.save()
-                else:
-                    vote = Vote.objects.create(votable_object_id=keyword_obj.id, votable_content_type=votable_content_type, user=request.user, vote=vote_value)
-                keyword_obj.calculate_status()  # Recalculate the status after the vote
+                keyword_obj = cast_vote(request.user, votable_content_type, keyword_obj.id, vote_value)
 
     else:
         keyword_form = KeyWordForm()
 
-    votes = keyword_obj.get_votes()
-    total_votes = votes.count()
-    total_approve_votes = votes.filter(vote=VoteType.APPROVE.value).count()
-    total_reject_votes = votes.filter(vote=VoteType.REJECT.value).count()
+    total_votes = keyword_obj.total_votes
+    total_approve_votes = keyword_obj.total_approve_votes
+    total_reject_votes = keyword_obj.total_reject_votes
     user_vote = keyword_obj.get_user_vote(request.user)
 
     context = {
@@ -129,24 +156,65 @@ def keyword_detail(request, keyword):
     return render(request, 'app01/keyword_detail.html', context)
 
 
+def build_keyword_tree(rows, root_id=None, depth=None):
+    # Assembles (id, parent_id, word, definition) rows into nested nodes in a single pass. Without a
+    # root_id the oldest top-level keyword is used; depth limits how many levels below the root are kept.
+    nodes = {}
+    child_ids = defaultdict(list)
+    for keyword_id, parent_id, word, definition in rows:
+        nodes[keyword_id] = {"name": word, "children": [], "definition": definition or ""}
+        child_ids[parent_id].append(keyword_id)
+
+    if root_id is None and child_ids[None]:
+        root_id = min(child_ids[None])
+    if root_id not in nodes:
+        return None
+
+    visited = {root_id}
+    stack = [(root_id, 0)]
+    while stack:
+        keyword_id, level = stack.pop()
+        if depth is not None and level >= depth:
+            continue
+        for child_id in child_ids[keyword_id]:
+            if child_id in visited:
+                continue  # guard against a parent cycle
+            visited.add(child_id)
+            nodes[keyword_id]["children"].append(nodes[child_id])
+            stack.append((child_id, level + 1))
+    return nodes[root_id]
+
+
+KEYWORD_JSON_TIMEOUT = 60 * 60 * 24  # seconds
+
+
+def keyword_json_etag(request):
+    # The tree version is a SharedCounter bumped by every KeyWord or KeyWordDefinition write that affects the
+    # tree, so all workers agree on it and never answer 304 for a tree another worker has changed
+    return str(get_keyword_tree_version())
+
+
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=keyword_json_etag)
 def keyword_json(request):
     try:
-        # Get the root keyword
-        root_keyword = KeyWord.objects.get(id=2)  # ids start from 1 not 0
-    except ObjectDoesNotExist:
-        return HttpResponse("Root keyword does not exist.", status=404)
-
-    # Recursive function to build the tree
-    def build_tree(keyword):
-        return {
-            "name": keyword.word,
-            "children": [build_tree(child) for child in keyword.children.all()],
-            "definition": keyword.definition.definition if hasattr(keyword, 'definition') else ""
-        }
+        root_id = int(request.GET['root']) if request.GET.get('root') else None
+        depth = int(request.GET['depth']) if request.GET.get('depth') else None
+    except ValueError:
+        return HttpResponseBadRequest("root and depth must be integers.")
+
+    cache_key = f'app01:keyword_json:{get_keyword_tree_version()}:{root_id}:{depth}'
+    content = cache.get(cache_key)
+    if content is None:
+        # Fetch every keyword with its definition in one query and build the tree in memory
+        rows = KeyWord.objects.order_by('id').values_list('id', 'parent_id', 'word', 'definition__definition')
+        tree = build_keyword_tree(rows, root_id, depth)
+        if tree is None:
+            return HttpResponse("Root keyword does not exist.", status=404)
+        content = json.dumps(tree, cls=DjangoJSONEncoder)
+        cache.set(cache_key, content, KEYWORD_JSON_TIMEOUT)
 
-    # Build the tree and return as JSON
-    tree = build_tree(root_keyword)
-    return JsonResponse(tree, safe=False)
+    return HttpResponse(content, content_type='application/json')
 
 
 def keyword_tree(request):
@@ -205,20 +273,83 @@ def update_status(request, pk):
         return redirect('app01:approved_changes')
 
 
+PAGE_SIZE = 25
+
+
+def keyset_paginate(queryset, request, page_size=PAGE_SIZE):
+    # Returns a page of the queryset ordered by id and the cursor for the next page (None on the last
+    # page). The cursor is the last id shown, passed back as ?after=<id>, so pages are fetched with an
+    # indexed range condition instead of an OFFSET.
+    queryset = queryset.order_by('id')
+    after = request.GET.get('after')
+    if after:
+        try:
+            queryset = queryset.filter(id__gt=int(after))
+        except ValueError:
+            raise Http404('Invalid page cursor.')
+
+    page = list(queryset[:page_size + 1])
+    next_cursor = page[page_size - 1].id if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
 class ApprovedChangesView(ListView):
     model = Question
     template_name = 'app01/approved_changes.html'
     context_object_name = 'questions'  # Change this to avoid confusion in the template
 
     def get_queryset(self):
-        return Question.objects.filter(status=Status.APPROVED.value)
+        return Question.objects.filter(status=Status.APPROVED.value).with_pending_votes()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['forms'] = {question.id: ChangeStatusForm(instance=question) for question in context['questions']}
+        questions, next_cursor = keyset_paginate(context['questions'], self.request)
+        merge_pending_tallies(questions)
+        Question.prefetch_question_paths(questions)
+        for question in questions:
+            # Only built if the template renders it, which it does for staff
+            question.status_form = SimpleLazyObject(partial(ChangeStatusForm, instance=question))
+        context['questions'] = questions
+        context['next_cursor'] = next_cursor
         return context
 
 
+CHANGE_LIST_STATUSES = {
+    'approved': Status.APPROVED.value,
+    'proposed': Status.PROPOSED.value,
+}
+
+
+@login_required
+def changes_json(request):
+    # Cursor-paginated approved or proposed questions (?status=approved|proposed&after=<id>), for
+    # infinite scrolling; the response's "next" is the cursor for the following page.
+    status = CHANGE_LIST_STATUSES.get(request.GET.get('status', 'approved'))
+    if status is None:
+        return HttpResponseBadRequest("status must be 'approved' or 'proposed'.")
+
+    questions, next_cursor = keyset_paginate(
+        Question.objects.filter(status=status).with_user_vote(request.user).with_pending_votes(), request
+    )
+    merge_pending_tallies(questions)
+    results = [
+        {
+            'id': question.id,
+            'question_text': question.question_text,
+            'status': question.status,
+            'answer_type': question.answer_type,
+            'total_votes': question.total_votes,
+            'total_approve_votes': question.total_approve_votes,
+            'total_reject_votes': question.total_reject_votes,
+            'participation_percentage': float(question.participation_percentage),
+            'approval_percentage': float(question.approval_percentage),
+            'user_vote': vote_label(question.user_vote),
+        }
+        for question in questions
+    ]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
 class QuestionDetailView(DetailView):
     model = Question
     template_name = 'app01/question_detail.html'
@@ -229,25 +360,21 @@ class ProposedChangesView(ListView):
     template_name = 'app01/proposed_changes.html'
 
     def get_queryset(self):
-        return Question.objects.filter(status=Status.PROPOSED.value)
+        # Vote totals and percentages come from the Votable counters plus any pending votes, the user's vote
+        # from a subquery
+        return Question.objects.filter(status=Status.PROPOSED.value).with_user_vote(
+            self.request.user
+        ).with_pending_votes()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_users'] = UserProfile.objects.filter(is_live=True).count()
-        proposed_questions = []
-        for question in context['object_list']:
-            stats, created = ProposalVoteData.objects.get_or_create(question=question)
-            question.total_votes = stats.total_votes
-            question.participation_percentage = stats.participation_percentage
-            question.total_approve_votes = stats.total_approve_votes
-            question.total_reject_votes = stats.total_reject_votes
-            question.approval_percentage = stats.approval_percentage  # This line has changed.
-            try:
-                question.user_vote = ProposalVote.objects.get(user=self.request.user, question=question).vote
-            except ProposalVote.DoesNotExist:
-                question.user_vote = None
-            proposed_questions.append(question)
+        proposed_questions, next_cursor = keyset_paginate(context['object_list'], self.request)
+        merge_pending_tallies(proposed_questions)
+        Question.prefetch_question_paths(proposed_questions)
+        context['total_users'] = get_live_user_count()
         context['proposed_questions'] = proposed_questions
+        context['next_cursor'] = next_cursor
+        context['votable_content_type'] = ContentType.objects.get_for_model(Question).id
         return context
 
 
@@ -319,7 +446,7 @@ def login_view(request):
 
 
 def home(request):
-    total_users = UserProfile.objects.filter(is_live=True, is_verified=True).count()
+    total_users = get_live_user_count(verified_only=True)
     return render(request, 'app01/home.html', {'total_users': total_users})  # Updated template path
 
 
@@ -0,0 +1,328 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import VOTE_TALLY_FIELDS, BufferedVote, SharedCounter, Vote, VoteCounterShard, VoteType, \
+    get_live_user_count, vote_deltas, vote_label
+
+# Upper bound on the queries cast_vote() may run, checked by the tests: upsert or delete the user's vote,
+# lock the votable, read the live user count and write the votable. Backends without upsert support read
+# the vote before writing it, which takes one more.
+CAST_VOTE_QUERY_BUDGET = 4
+
+# SharedCounter row that flush_vote_buffer() updates at the start of each batch, so that flushers queue
+VOTE_BUFFER_FLUSH_COUNTER = 'vote_buffer_flushes'
+
+# Backends that support INSERT ... ON CONFLICT DO UPDATE together with RETURNING
+UPSERT_VENDORS = {'postgresql', 'sqlite'}
+
+
+def supports_vote_upsert():
+    return connection.vendor in UPSERT_VENDORS and connection.features.can_return_columns_from_insert
+
+
+def vote_key_columns():
+    qn = connection.ops.quote_name
+    return [qn(Vote._meta.get_field(name).column) for name in ['user', 'votable_content_type', 'votable_object_id']]
+
+
+def upsert_vote(user_id, content_type_id, object_id, vote_value):
+    # Inserts or updates the user's vote in one statement and returns the vote it replaced (None if
+    # there wasn't one). The previous value is read from the conflicting row inside the same statement,
+    # so it stays correct when the same user submits twice at once.
+    qn = connection.ops.quote_name
+    table = qn(Vote._meta.db_table)
+    vote_column = qn(Vote._meta.get_field('vote').column)
+    previous_column = qn(Vote._meta.get_field('previous_vote').column)
+    created_column = qn(Vote._meta.get_field('created_at').column)
+    key_columns = ', '.join(vote_key_columns())
+    sql = (
+        f'INSERT INTO {table} ({key_columns}, {vote_column}, {previous_column}, {created_column}) '
+        f'VALUES (%s, %s, %s, %s, NULL, %s) '
+        f'ON CONFLICT ({key_columns}) DO UPDATE SET '
+        f'{previous_column} = {table}.{vote_column}, {vote_column} = EXCLUDED.{vote_column} '
+        f'RETURNING {previous_column}'
+    )
+    params = [user_id, content_type_id, object_id, vote_value,
+              connection.ops.adapt_datetimefield_value(timezone.now())]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def delete_vote(user_id, content_type_id, object_id):
+    # Deletes the user's vote and returns the value it held (None if there wasn't one)
+    table = connection.ops.quote_name(Vote._meta.db_table)
+    vote_column = connection.ops.quote_name(Vote._meta.get_field('vote').column)
+    conditions = ' AND '.join(f'{column} = %s' for column in vote_key_columns())
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {conditions} RETURNING {vote_column}',
+                       [user_id, content_type_id, object_id])
+        row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def write_vote(user_id, content_type_id, object_id, vote_value):
+    # Read-then-write fallback for backends without upsert support; returns the previous vote
+    vote = Vote.objects.filter(
+        user_id=user_id, votable_content_type_id=content_type_id, votable_object_id=object_id
+    ).first()
+    old_vote = vote.vote if vote is not None else None
+
+    if vote_value == VoteType.NO_VOTE.value:
+        if vote is not None:
+            vote.delete(update_tally=False)
+    elif vote is None:
+        Vote(user_id=user_id, votable_content_type_id=content_type_id, votable_object_id=object_id,
+             vote=vote_value).save(update_tally=False)
+    elif vote.vote != vote_value:
+        vote.previous_vote = vote.vote
+        vote.vote = vote_value
+        vote.save(update_fields=['vote', 'previous_vote'], update_tally=False)
+    return old_vote
+
+
+def store_vote(user_id, content_type_id, object_id, vote_value):
+    # Writes the user's vote (NO_VOTE removes it) and returns the vote it replaced
+    if not supports_vote_upsert():
+        return write_vote(user_id, content_type_id, object_id, vote_value)
+    elif vote_value == VoteType.NO_VOTE.value:
+        return delete_vote(user_id, content_type_id, object_id)
+    return upsert_vote(user_id, content_type_id, object_id, vote_value)
+
+
+def cast_vote(user, content_type, object_id, vote_value):
+    # Records the user's vote on a votable object (NO_VOTE removes it) and updates the object's tally
+    # in the same transaction. Returns the votable object with its new counters, percentages and status.
+    vote_value = int(vote_value)
+    model = content_type.model_class()
+
+    if settings.VOTE_WRITE_BEHIND:
+        votable = model.objects.get(pk=object_id)
+        buffer_vote(user, content_type, object_id, vote_value)
+        return merge_pending_votes(votable)
+
+    # Both transactions below start with the vote write. SQLite ignores select_for_update(), and a
+    # transaction that reads before it writes cannot wait for another writer to finish: it fails with
+    # "database is locked" instead. Writing first takes the write lock up front, so concurrent votes queue.
+    if settings.VOTE_COUNTER_SHARDS:
+        with transaction.atomic():
+            old_vote = store_vote(user.pk, content_type.pk, object_id, vote_value)
+            votable = model.objects.get(pk=object_id)
+            add_to_counter_shard(content_type.pk, object_id, vote_deltas(old_vote, vote_value))
+        return merge_counter_shards(votable)
+
+    with transaction.atomic():
+        old_vote = store_vote(user.pk, content_type.pk, object_id, vote_value)
+        # Locking the votable orders concurrent tally updates for this object
+        votable = model.objects.select_for_update().get(pk=object_id)
+        votable.apply_vote_delta(old_vote, vote_value, locked=True)
+    return votable
+
+
+def add_to_counter_shard(content_type_id, object_id, tally_deltas):
+    # Adds (total, approve, reject) deltas to a randomly chosen counter shard of the object
+    if not any(tally_deltas):
+        return
+    shard_key = {
+        'votable_content_type_id': content_type_id,
+        'votable_object_id': object_id,
+        'shard': random.randrange(settings.VOTE_COUNTER_SHARDS),
+    }
+    increments = {field: F(field) + delta for field, delta in zip(VOTE_TALLY_FIELDS, tally_deltas)}
+    if VoteCounterShard.objects.filter(**shard_key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            VoteCounterShard.objects.create(**shard_key, **dict(zip(VOTE_TALLY_FIELDS, tally_deltas)))
+    except IntegrityError:
+        # Another vote created this shard first
+        VoteCounterShard.objects.filter(**shard_key).update(**increments)
+
+
+def merge_counter_shards(votable):
+    # Adds the object's not yet compacted shard totals to its in-memory counters and percentages.
+    # Nothing is saved and the stored status is left as it is until compaction.
+    content_type = ContentType.objects.get_for_model(votable)
+    totals = VoteCounterShard.objects.filter(
+        votable_content_type=content_type, votable_object_id=votable.pk
+    ).aggregate(**{field: Sum(field) for field in VOTE_TALLY_FIELDS})
+    if any(totals.values()):
+        for field in VOTE_TALLY_FIELDS:
+            setattr(votable, field, getattr(votable, field) + (totals[field] or 0))
+        status = votable.status
+        votable.update_percentages(get_live_user_count())
+        votable.status = status
+    return votable
+
+
+def compact_vote_counter_shards(batch_size=500):
+    # Folds the counter shards of up to batch_size objects at a time back into the votable counters,
+    # recalculating their percentages and status. Returns the number of objects compacted.
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            keys = list(VoteCounterShard.objects.order_by('votable_content_type_id', 'votable_object_id')
+                        .values_list('votable_content_type_id', 'votable_object_id').distinct()[:batch_size])
+            if not keys:
+                return compacted
+
+            object_ids = defaultdict(list)
+            for content_type_id, object_id in keys:
+                object_ids[content_type_id].append(object_id)
+
+            for content_type_id, ids in object_ids.items():
+                model = ContentType.objects.get_for_id(content_type_id).model_class()
+                votables = {votable.pk: votable
+                            for votable in model.objects.select_for_update().filter(pk__in=ids).order_by('pk')}
+                shards = list(VoteCounterShard.objects.select_for_update().filter(
+                    votable_content_type_id=content_type_id, votable_object_id__in=ids))
+                totals = defaultdict(lambda: [0, 0, 0])
+                for shard in shards:
+                    for i, field in enumerate(VOTE_TALLY_FIELDS):
+                        totals[shard.votable_object_id][i] += getattr(shard, field)
+                for object_id, deltas in totals.items():
+                    if object_id in votables:  # shards of deleted objects are simply dropped
+                        votables[object_id].apply_tally_deltas(deltas, locked=True)
+                VoteCounterShard.objects.filter(pk__in=[shard.pk for shard in shards]).delete()
+            compacted += len(keys)
+
+
+def buffer_vote(user, content_type, object_id, vote_value):
+    # Write-behind mode: acknowledge the vote by appending it to the buffer. With
+    # VOTE_BUFFER_SYNCHRONOUS_COMMIT off, PostgreSQL confirms the commit before it is flushed to disk,
+    # so a crash can lose the last moments of buffered votes in exchange for lower latency.
+    with transaction.atomic():
+        if not settings.VOTE_BUFFER_SYNCHRONOUS_COMMIT and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL synchronous_commit TO OFF')
+        # Inserted first so that on SQLite the transaction holds the write lock before it reads (see cast_vote)
+        buffered = BufferedVote.objects.create(user=user, votable_content_type=content_type,
+                                               votable_object_id=object_id, vote=vote_value)
+        vote_key = {'votable_content_type': content_type, 'votable_object_id': object_id, 'user': user}
+        previous = BufferedVote.objects.filter(**vote_key, pk__lt=buffered.pk).order_by('-pk').values_list(
+            'vote', flat=True
+        ).first()
+        if previous is None:
+            previous = Vote.objects.filter(**vote_key).values_list('vote', flat=True).first()
+        tally_deltas = dict(zip(VOTE_TALLY_FIELDS, vote_deltas(previous, vote_value)))
+        if any(tally_deltas.values()):
+            BufferedVote.objects.filter(pk=buffered.pk).update(**tally_deltas)
+
+
+def pending_tally_deltas(votable):
+    # (total, approve, reject) deltas that this object's buffered votes will apply once flushed
+    content_type = ContentType.objects.get_for_model(votable)
+    totals = BufferedVote.objects.filter(
+        votable_content_type=content_type, votable_object_id=votable.pk
+    ).aggregate(**{field: Sum(field) for field in VOTE_TALLY_FIELDS})
+    return tuple(totals[field] or 0 for field in VOTE_TALLY_FIELDS)
+
+
+def merge_pending_votes(votable):
+    # Adds buffered votes that haven't been flushed yet to the in-memory counters and percentages, so
+    # displayed totals include them. Nothing is saved and the stored status is left as it is.
+    total_votes, total_approve_votes, total_reject_votes = pending_tally_deltas(votable)
+    if total_votes or total_approve_votes or total_reject_votes:
+        votable.total_votes += total_votes
+        votable.total_approve_votes += total_approve_votes
+        votable.total_reject_votes += total_reject_votes
+        status = votable.status
+        votable.update_percentages(get_live_user_count())
+        votable.status = status
+    return votable
+
+
+
+def merge_pending_tallies(votables):
+    # Adds the pending_* annotations of VotableQuerySet.with_pending_votes() to each object's in-memory
+    # counters and percentages, as merge_counter_shards() and merge_pending_votes() do for a single object.
+    # Nothing is saved and the stored statuses are left as they are.
+    total_users = None
+    for votable in votables:
+        deltas = [getattr(votable, f'pending_{field}', 0) for field in VOTE_TALLY_FIELDS]
+        if not any(deltas):
+            continue
+        for field, delta in zip(VOTE_TALLY_FIELDS, deltas):
+            setattr(votable, field, getattr(votable, field) + delta)
+        if total_users is None:
+            total_users = get_live_user_count()
+        status = votable.status
+        votable.update_percentages(total_users)
+        votable.status = status
+    return votables
+
+def flush_vote_buffer(batch_size=1000):
+    # Applies buffered votes in batches. Within a batch only the latest vote per user and object counts,
+    # and each object's counters are written once with the summed deltas. Returns the buffered rows
+    # flushed.
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            # One flusher at a time: batches applied out of order would let an older buffered vote overwrite
+            # a newer one. Updating the counter row first takes a lock that other flushers wait for until this
+            # batch commits (on SQLite, the database write lock).
+            if not SharedCounter.add(VOTE_BUFFER_FLUSH_COUNTER, 1):
+                SharedCounter.get_value(VOTE_BUFFER_FLUSH_COUNTER, int)
+                SharedCounter.add(VOTE_BUFFER_FLUSH_COUNTER, 1)
+            batch = list(BufferedVote.objects.order_by('id')[:batch_size])
+            if not batch:
+                return flushed
+
+            latest_votes = {}
+            for buffered in batch:
+                key = (buffered.votable_content_type_id, buffered.votable_object_id, buffered.user_id)
+                latest_votes[key] = buffered.vote
+
+            object_ids = defaultdict(set)
+            for content_type_id, object_id, user_id in latest_votes:
+                object_ids[content_type_id].add(object_id)
+            model_classes = {content_type_id: ContentType.objects.get_for_id(content_type_id).model_class()
+                             for content_type_id in object_ids}
+            existing = {
+                (content_type_id, object_id)
+                for content_type_id, ids in object_ids.items()
+                for object_id in model_classes[content_type_id].objects.filter(pk__in=ids).values_list('pk', flat=True)
+            }
+
+            # Votes are written before their objects are locked, the order cast_vote() and Vote.save() use,
+            # so that a flush and a direct vote on the same object cannot deadlock
+            tally_deltas = defaultdict(lambda: [0, 0, 0])
+            for (content_type_id, object_id, user_id), vote in latest_votes.items():
+                if (content_type_id, object_id) not in existing:
+                    continue  # the object has been deleted since the vote was buffered
+                old_vote = store_vote(user_id, content_type_id, object_id, vote)
+                for i, delta in enumerate(vote_deltas(old_vote, vote)):
+                    tally_deltas[(content_type_id, object_id)][i] += delta
+
+            votables = {}
+            for content_type_id, ids in sorted(object_ids.items()):
+                locked = model_classes[content_type_id].objects.select_for_update().filter(pk__in=ids).order_by('pk')
+                for votable in locked:
+                    votables[(content_type_id, votable.pk)] = votable
+
+            for key, deltas in tally_deltas.items():
+                if key in votables:
+                    votables[key].apply_tally_deltas(deltas, locked=True)
+
+            BufferedVote.objects.filter(pk__in=[buffered.pk for buffered in batch]).delete()
+        flushed += len(batch)
+
+
+def vote_payload(votable, vote_value):
+    # JSON response for a submitted vote, built from the values cast_vote() left in memory
+    return {
+        'total_votes': votable.total_votes,
+        'status': votable.status,
+        'user_vote': vote_label(vote_value),
+        'approval_percentage': float(votable.approval_percentage),
+        'rejection_percentage': 100 - float(votable.approval_percentage),
+        'participation_percentage': float(votable.participation_percentage),
+        'total_approve_votes': votable.total_approve_votes,
+        'total_reject_votes': votable.total_reject_votes,
+    }
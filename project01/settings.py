@@ -74,6 +74,40 @@ DATABASES = {
     'default': dj_database_url.config(default=os.getenv('DATABASE_URL'))
 }
 
+# SQLite tests use a file instead of the default in-memory database, so the threaded tests in app01 lock
+# the database the way concurrent workers do
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', BASE_DIR / 'test_db.sqlite3')
+
+# Cache
+# Only holds derived content that is safe to keep per process; counters and versions that every worker must
+# agree on are stored in the database (see app01.models.SharedCounter). A shared backend such as
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache lets workers reuse each other's entries.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Tokenizer used to find keywords in definitions: 'regex' (default) or 'nltk', which needs nltk and its
+# punkt data installed.
+
+KEYWORD_TOKENIZER = os.getenv('KEYWORD_TOKENIZER', 'regex')
+
+# Write-behind vote ingestion: when enabled, submitted votes are appended to a buffer table and applied
+# in batches by the flush_vote_buffer command. Turning VOTE_BUFFER_SYNCHRONOUS_COMMIT off lets PostgreSQL
+# acknowledge buffered votes before they reach disk.
+
+VOTE_WRITE_BEHIND = os.getenv('VOTE_WRITE_BEHIND', 'False') == 'True'
+VOTE_BUFFER_SYNCHRONOUS_COMMIT = os.getenv('VOTE_BUFFER_SYNCHRONOUS_COMMIT', 'True') == 'True'
+
+# Number of counter shards each votable's vote totals are spread over (0 disables sharding). Shards are
+# folded back into the votable counters by the compact_vote_counters command.
+
+VOTE_COUNTER_SHARDS = int(os.getenv('VOTE_COUNTER_SHARDS', '0'))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 